@@ -0,0 +1,363 @@
+"""批量报价命令行工具
+
+不依赖 Kivy，可在没有显示器的服务器上运行。逐行读取 CSV 或 JSONL 订单文件，
+按指定模板计算报价并逐行写出结果，内存占用与文件大小无关。
+指定 --workers 时按块分发到多个进程计算，输出仍保持原始行顺序。
+    
+    python batch_quote.py orders.csv -o quotes.csv --template 默认模板
+"""
+import argparse
+import csv
+import json
+import os
+import sqlite3
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from calculator_logic import ENGINE_FIXED, ENGINES, QuoteInput, TemplateParams, quote
+from template_manager import DEFAULT_SETTINGS, TemplateManager
+from template_store import SqliteTemplateManager
+
+# 订单文件中可以使用的列名，中文列名与界面上的名称一致
+FIELD_ALIASES = {
+    'opening': ('opening', '开口'),
+    'width': ('width', '宽度'),
+    'thickness': ('thickness', '厚度'),
+    'quantity': ('quantity', '个数'),
+    'param_value': ('param_value', '参数值'),
+    'material_price': ('material_price', '原料价格'),
+    'process_param': ('process_param', '加工工费参数'),
+    'print_param': ('print_param', '印刷工费参数'),
+    'material_type': ('material_type', '版材类型'),
+}
+
+RESULT_FIELDS = (
+    'material_unit_price', 'material_weight', 'process_unit_price', 'process_fee',
+    'print_unit_price', 'print_fee', 'bag_unit_price', 'total_fee',
+)
+
+def load_template_settings(data_file, template_name=None):
+    """读取模板设置；不指定模板时使用默认模板，数据文件不存在时使用内置默认值
+    
+    数据文件扩展名为 .db / .sqlite / .sqlite3 时按 SQLite 模板库读取。
+    只读取，不会修改数据文件；数据文件无法解析时抛出 ValueError。
+    """
+    if not os.path.exists(data_file):
+        if template_name:
+            raise ValueError(f"模板数据文件不存在：{data_file}")
+        return dict(DEFAULT_SETTINGS)
+    
+    if data_file.lower().endswith(('.db', '.sqlite', '.sqlite3')):
+        template_manager = SqliteTemplateManager(data_file, read_only=True)
+        try:
+            name = template_name or template_manager.get_default_template_name()
+            settings = template_manager.get_template_settings(name) if name else None
+        except sqlite3.DatabaseError as e:
+            raise ValueError(f"模板数据库无法读取：{data_file}：{e}") from e
+        finally:
+            template_manager.close()
+    else:
+        template_manager = TemplateManager(data_file, read_only=True)
+        name = template_name or template_manager.get_default_template_name()
+        settings = template_manager.get_template_settings(name) if name else None
+    if settings is None:
+        raise ValueError(f"模板 '{template_name}' 不存在")
+    settings = dict(DEFAULT_SETTINGS, **settings)
+    # 提前校验，模板中的数值无法解析时在开始计算前报错
+    TemplateParams.from_settings(settings)
+    return settings
+
+
+def detect_format(path, default='csv'):
+    """按扩展名判断文件格式"""
+    if path.lower().endswith(('.jsonl', '.ndjson', '.json')):
+        return 'jsonl'
+    if path.lower().endswith('.csv'):
+        return 'csv'
+    return default
+
+
+class InvalidOrder(dict):
+    """无法解析的订单行：内容为空，error 说明原因，和计算出错的行一样写出"""
+    
+    def __init__(self, error):
+        super().__init__()
+        self.error = error
+
+
+def read_orders(stream, fmt):
+    """逐行产出订单字典；JSONL 中无法解析或不是对象的行产出 InvalidOrder，不中断整个文件"""
+    if fmt == 'csv':
+        yield from csv.DictReader(stream)
+        return
+    
+    for line_number, line in enumerate(stream, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield InvalidOrder(f"第{line_number}行不是有效的 JSON：{e}")
+            continue
+        if not isinstance(row, dict):
+            yield InvalidOrder(f"第{line_number}行不是 JSON 对象")
+            continue
+        yield row
+
+
+def _pick(row, field):
+    for alias in FIELD_ALIASES[field]:
+        value = row.get(alias)
+        if value not in (None, ''):
+            return value
+    return None
+
+
+def build_quote_input(row, settings):
+    """把一行订单和模板参数合并为 QuoteInput，订单中的参数列优先于模板
+    
+    settings 可以是模板设置字典，也可以是已解析的 TemplateParams；逐行调用时应传入后者。
+    """
+    if not isinstance(settings, TemplateParams):
+        settings = TemplateParams.from_settings(settings)
+    
+    def number(field, default):
+        picked = _pick(row, field)
+        return getattr(settings, field) if picked is None else float(picked or default)
+    
+    return QuoteInput(
+        float(_pick(row, 'opening') or 0), float(_pick(row, 'width') or 0), float(_pick(row, 'thickness') or 0),
+        number('param_value', 0.95), number('material_price', 9), float(_pick(row, 'quantity') or 0),
+        number('process_param', 0.2), number('print_param', 0.015), _pick(row, 'material_type') or settings.material_type,
+        settings.material_enabled, settings.process_enabled, settings.print_enabled,
+        settings.material_type_price_copper, settings.material_type_price_rubber,
+    )
+
+
+def quote_orders(rows, settings, engine=ENGINE_FIXED):
+    """逐行计算报价，产出 (订单, Quote, 错误信息)；模板设置只解析一次"""
+    if not isinstance(settings, TemplateParams):
+        settings = TemplateParams.from_settings(settings)
+    for row in rows:
+        if isinstance(row, InvalidOrder):
+            yield row, None, row.error
+            continue
+        try:
+            result = quote(build_quote_input(row, settings), engine, detail=False)
+        except Exception as e:
+            yield row, None, str(e)
+        else:
+            yield row, result, None
+
+
+def result_fields(result):
+    """Quote 中需要写出的结果字段"""
+    return {
+        'material_unit_price': result.material_unit_price,
+        'material_weight': result.material_weight,
+        'process_unit_price': result.process_unit_price,
+        'process_fee': result.process_fee,
+        'print_unit_price': result.print_unit_price,
+        'print_fee': result.print_fee,
+        'bag_unit_price': result.bag_unit_price,
+        'total_fee': round(result.total_fee, 3),
+    }
+
+
+def quote_chunk(rows, settings, engine=ENGINE_FIXED):
+    """在工作进程中计算一块订单，返回 (进程号, [(订单, 结果字段, 错误信息)], 用时)"""
+    started = time.perf_counter()
+    results = [
+        (row, result_fields(result) if result is not None else None, error)
+        for row, result, error in quote_orders(rows, settings, engine)
+    ]
+    return os.getpid(), results, time.perf_counter() - started
+
+
+def chunked(rows, size):
+    """把行流切成长度不超过 size 的列表"""
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class WorkerStats:
+    """按工作进程汇总处理行数和计算用时"""
+    
+    def __init__(self):
+        self.workers = {}
+    
+    def record(self, pid, rows, seconds):
+        stats = self.workers.setdefault(pid, [0, 0, 0.0])
+        stats[0] += 1
+        stats[1] += rows
+        stats[2] += seconds
+    
+    def report(self):
+        lines = []
+        for pid, (chunks, rows, seconds) in sorted(self.workers.items()):
+            rate = rows / seconds if seconds > 0 else 0.0
+            lines.append(f"进程 {pid}：{chunks} 块，{rows} 行，计算 {seconds:.2f} 秒（{rate:.0f} 行/秒）")
+        return "\n".join(lines)
+
+
+def quote_orders_parallel(rows, settings, engine=ENGINE_FIXED, workers=None, chunk_size=10000, stats=None):
+    """多进程分块计算，按原始顺序产出 (订单, 结果字段, 错误信息)
+    
+    同时在途的块数限制为工作进程数的两倍，内存占用只与块大小有关。
+    """
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        
+        def drain():
+            pid, results, seconds = pending.popleft().result()
+            if stats is not None:
+                stats.record(pid, len(results), seconds)
+            return results
+        
+        for chunk in chunked(rows, chunk_size):
+            pending.append(executor.submit(quote_chunk, chunk, settings, engine))
+            if len(pending) >= workers * 2:
+                yield from drain()
+        while pending:
+            yield from drain()
+
+
+class ResultWriter:
+    """把报价结果逐行写入 CSV 或 JSONL"""
+    
+    def __init__(self, stream, fmt):
+        self.stream = stream
+        self.fmt = fmt
+        self._csv_writer = None
+    
+    def write(self, row, fields, error):
+        record = dict(row)
+        if fields is not None:
+            record.update(fields)
+        record['error'] = error or ''
+        
+        if self.fmt == 'jsonl':
+            self.stream.write(json.dumps(record, ensure_ascii=False))
+            self.stream.write('\n')
+            return
+        
+        if self._csv_writer is None:
+            fieldnames = list(row) + [field for field in RESULT_FIELDS if field not in row] + ['error']
+            self._csv_writer = csv.DictWriter(self.stream, fieldnames=fieldnames, extrasaction='ignore')
+            self._csv_writer.writeheader()
+        self._csv_writer.writerow(record)
+
+
+def run(input_stream, output_stream, settings, input_format='csv', output_format='csv',
+        engine=ENGINE_FIXED, stop_on_error=False, flush_every=1000,
+        workers=1, chunk_size=10000, stats=None):
+    """流式处理整个订单文件，返回 (行数, 错误行数)
+    
+    workers 大于 1 时使用多进程分块计算，stats 为 WorkerStats 时记录各进程吞吐量。
+    """
+    writer = ResultWriter(output_stream, output_format)
+    rows = read_orders(input_stream, input_format)
+    if workers > 1:
+        results = quote_orders_parallel(rows, settings, engine, workers, chunk_size, stats)
+    else:
+        results = (
+            (row, result_fields(result) if result is not None else None, error)
+            for row, result, error in quote_orders(rows, settings, engine)
+        )
+    
+    count = 0
+    errors = 0
+    for row, fields, error in results:
+        count += 1
+        if error is not None:
+            errors += 1
+            if stop_on_error:
+                raise ValueError(f"第{count}行计算过程中发生错误：{error}")
+        writer.write(row, fields, error)
+        if count % flush_every == 0:
+            output_stream.flush()
+    output_stream.flush()
+    return count, errors
+
+
+def _open_input(path):
+    if path == '-':
+        return sys.stdin
+    return open(path, 'r', encoding='utf-8-sig', newline='')
+
+
+def _open_output(path):
+    if path == '-':
+        return sys.stdout
+    return open(path, 'w', encoding='utf-8', newline='')
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="批量计算订单文件中的袋子单价")
+    parser.add_argument('input', help="订单文件（CSV 或 JSONL），- 表示标准输入")
+    parser.add_argument('-o', '--output', default='-', help="结果文件，默认写到标准输出")
+    parser.add_argument('-t', '--template', help="模板名称，默认使用默认模板")
+    parser.add_argument('--data-file', default="不能删除的数据文件.json", help="模板数据文件")
+    parser.add_argument('--input-format', choices=('csv', 'jsonl'), help="输入格式，默认按扩展名判断")
+    parser.add_argument('--output-format', choices=('csv', 'jsonl'), help="输出格式，默认按扩展名判断")
+    parser.add_argument('--engine', choices=sorted(ENGINES), default=ENGINE_FIXED, help="计算引擎")
+    parser.add_argument('--stop-on-error', action='store_true', help="遇到无法计算的行时立即停止")
+    parser.add_argument('-j', '--workers', type=int, default=1,
+                        help="计算进程数，0 表示使用全部 CPU 核心，默认 1（单进程）")
+    parser.add_argument('--chunk-size', type=int, default=10000, help="多进程时每块的行数")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    
+    try:
+        settings = load_template_settings(args.data_file, args.template)
+    except ValueError as e:
+        print(f"加载模板失败: {e}", file=sys.stderr)
+        return 2
+    
+    input_format = args.input_format or detect_format(args.input)
+    output_format = args.output_format or detect_format(args.output, input_format)
+    
+    workers = args.workers if args.workers > 0 else (os.cpu_count() or 1)
+    stats = WorkerStats()
+    
+    started = time.perf_counter()
+    input_stream = _open_input(args.input)
+    output_stream = _open_output(args.output)
+    try:
+        count, errors = run(
+            input_stream, output_stream, settings, input_format, output_format,
+            args.engine, args.stop_on_error,
+            workers=workers, chunk_size=args.chunk_size, stats=stats,
+        )
+    except ValueError as e:
+        print(f"批量报价失败: {e}", file=sys.stderr)
+        return 1
+    finally:
+        if input_stream is not sys.stdin:
+            input_stream.close()
+        if output_stream is not sys.stdout:
+            output_stream.close()
+    
+    elapsed = time.perf_counter() - started
+    rate = count / elapsed if elapsed > 0 else 0.0
+    print(f"完成：{count} 行，错误 {errors} 行，用时 {elapsed:.2f} 秒（{rate:.0f} 行/秒）", file=sys.stderr)
+    if stats.workers:
+        print(stats.report(), file=sys.stderr)
+    return 1 if errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,98 @@
+"""报价计算的基准用例：单次报价、批量报价、按列批量计算"""
+import itertools
+import random
+
+from batch_quote import quote_orders
+from calculator_logic import CalculatorLogic, ENGINE_FIXED
+from template_manager import DEFAULT_SETTINGS
+
+from harness import run_case
+
+# 批量报价每次调用处理的行数
+CHUNK_ROWS = 1000
+
+
+def synthetic_orders(count, seed=0):
+    """生成 count 行订单字典，取值与 CSV 读入的一样是字符串"""
+    rng = random.Random(seed)
+    for index in range(count):
+        yield {
+            'order_id': str(index),
+            '开口': str(rng.randint(10, 80)),
+            '宽度': str(rng.randint(10, 90)),
+            '厚度': str(round(rng.uniform(2, 12), 1)),
+            '个数': str(rng.choice((100, 500, 1000, 3000, 5000, 10000, 50000))),
+            '版材类型': rng.choice(('铜板', '胶板')),
+        }
+
+
+def _spec_inputs(count, seed=1):
+    rng = random.Random(seed)
+    return [
+        (str(rng.randint(10, 80)), str(rng.randint(10, 90)), str(round(rng.uniform(2, 12), 1)),
+         '0.95', '9', str(rng.choice((500, 1000, 5000, 20000))), '0.2', '0.015', '铜板')
+        for _ in range(count)
+    ]
+
+
+def bench_calculate_all(detail, calls, engine, cached=False):
+    specs = _spec_inputs(50 if cached else 1000)
+    
+    def make_op():
+        calculator = CalculatorLogic(engine)
+        calculator.detail_enabled = detail
+        if cached:
+            calculator.enable_cache(256)
+        cycle = itertools.cycle(specs)
+        
+        def op():
+            calculator.set_values(*next(cycle))
+            result = calculator.calculate_all()
+            if detail:
+                # detail_text 延迟生成，访问一次才计入成本
+                result['detail_text']
+        return op
+    
+    name = 'calculate_all.' + ('cached' if cached else 'detail' if detail else 'no_detail')
+    return run_case(name, make_op, calls, params={'engine': engine})
+
+
+def bench_quote_orders(rows, engine, memory_rows):
+    def make_op():
+        results = quote_orders(synthetic_orders(rows), DEFAULT_SETTINGS, engine)
+        
+        def op():
+            for _ in itertools.islice(results, CHUNK_ROWS):
+                pass
+        return op
+    
+    calls = max(1, rows // CHUNK_ROWS)
+    return run_case(f'quote_orders.{rows}', make_op, calls, batch=CHUNK_ROWS,
+                    memory_calls=max(1, memory_rows // CHUNK_ROWS), params={'engine': engine, 'rows': rows})
+
+
+def bench_calculate_batch(rows, engine, repeat=5):
+    rng = random.Random(2)
+    openings = [float(rng.randint(10, 80)) for _ in range(rows)]
+    widths = [float(rng.randint(10, 90)) for _ in range(rows)]
+    thicknesses = [round(rng.uniform(2, 12), 1) for _ in range(rows)]
+    quantities = [float(rng.choice((500, 1000, 5000, 20000))) for _ in range(rows)]
+    
+    def make_op():
+        calculator = CalculatorLogic(engine)
+        return lambda: calculator.calculate_batch(openings, widths, thicknesses, quantities)
+    
+    return run_case(f'calculate_batch.{rows}', make_op, repeat, batch=rows,
+                    memory_calls=1, params={'engine': engine, 'rows': rows})
+
+
+def run(rows=(10000, 1000000), engine=ENGINE_FIXED, quote_calls=20000, memory_rows=100000):
+    results = [
+        bench_calculate_all(True, quote_calls, engine),
+        bench_calculate_all(False, quote_calls, engine),
+        bench_calculate_all(False, quote_calls, engine, cached=True),
+    ]
+    for count in rows:
+        results.append(bench_quote_orders(count, engine, memory_rows))
+    results.append(bench_calculate_batch(min(rows), engine))
+    return results
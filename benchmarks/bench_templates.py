@@ -0,0 +1,99 @@
+"""模板存储的基准用例：加载、保存（修改一个模板并写入）、新建、重命名、设为默认
+
+日志模式关闭后台合并，计时只包含追加日志本身，不会混入并发的合并线程。
+"""
+import itertools
+import json
+import math
+import os
+import shutil
+import tempfile
+
+from template_manager import DEFAULT_SETTINGS, TemplateManager
+from template_store import SqliteTemplateManager
+
+from harness import run_case
+
+BACKENDS = ('json', 'journal', 'sqlite')
+
+
+def _write_templates(path, count):
+    templates = {"默认模板": {"name": "默认模板", "is_default": True, "settings": dict(DEFAULT_SETTINGS)}}
+    for index in range(1, count):
+        name = f"客户{index:05d}"
+        templates[name] = {"name": name, "is_default": False,
+                           "settings": dict(DEFAULT_SETTINGS, param_value=str(index))}
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({"templates": templates, "last_used_template": "默认模板"}, f, ensure_ascii=False, indent=2)
+
+
+def _open(backend, directory):
+    json_file = os.path.join(directory, 'templates.json')
+    if backend == 'sqlite':
+        return SqliteTemplateManager(os.path.join(directory, 'templates.db'), json_file)
+    if backend == 'journal':
+        return TemplateManager(json_file, journal=True, journal_limit=math.inf)
+    return TemplateManager(json_file)
+
+
+def _close(manager):
+    if isinstance(manager, SqliteTemplateManager):
+        manager.close()
+
+
+def _open_and_close(backend, directory):
+    _close(_open(backend, directory))
+
+
+def _calls(count, limit):
+    # 模板越多单次越慢，调用次数相应减少，保证总时长可控
+    return max(5, min(limit, 200000 // count))
+
+
+def bench_backend(backend, count):
+    directory = tempfile.mkdtemp(prefix='bench_templates_')
+    try:
+        _write_templates(os.path.join(directory, 'templates.json'), count)
+        manager = _open(backend, directory)
+        params = {'backend': backend, 'templates': count}
+        prefix = f'templates.{backend}.{count}'
+        results = [run_case(f'{prefix}.load', lambda: lambda: _open_and_close(backend, directory),
+                            _calls(count, 50), params=params)]
+        
+        # 每次修改同一个模板的参数值，三种存储都会把这次修改写入文件
+        values = itertools.cycle(("1.5", "2.5"))
+        
+        def make_save():
+            return lambda: manager.update_template("客户00001", dict(DEFAULT_SETTINGS, param_value=next(values)))
+        results.append(run_case(f'{prefix}.save', make_save, _calls(count, 50), params=params))
+        
+        counter = itertools.count()
+        
+        def make_create():
+            return lambda: manager.create_template(f"新模板{next(counter)}", DEFAULT_SETTINGS)
+        results.append(run_case(f'{prefix}.create', make_create, _calls(count, 200), params=params))
+        
+        names = itertools.cycle((("客户00001", "改名00001"), ("改名00001", "客户00001")))
+        
+        def make_rename():
+            return lambda: manager.rename_template(*next(names))
+        results.append(run_case(f'{prefix}.rename', make_rename, _calls(count, 200), params=params))
+        
+        defaults = itertools.cycle(("客户00002", "默认模板"))
+        
+        def make_set_default():
+            return lambda: manager.set_default_template(next(defaults))
+        results.append(run_case(f'{prefix}.set_default', make_set_default, _calls(count, 200), params=params))
+        
+        _close(manager)
+        return results
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def run(counts=(10, 100, 1000, 10000), backends=BACKENDS):
+    results = []
+    for backend in backends:
+        for count in counts:
+            results.extend(bench_backend(backend, max(count, 3)))
+    return results
@@ -0,0 +1,119 @@
+"""基准测试的计时、内存统计和基线比较"""
+import gc
+import json
+import math
+import platform
+import sys
+import time
+import tracemalloc
+
+# 峰值内存变化小于该值（KB）时视为噪声
+MEMORY_NOISE_KB = 64
+
+
+def percentile(sorted_values, fraction):
+    """已排序数据的分位数（线性插值）"""
+    if not sorted_values:
+        return 0.0
+    position = (len(sorted_values) - 1) * fraction
+    lower = math.floor(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+def run_case(name, make_op, calls, batch=1, memory_calls=None, params=None):
+    """运行一个用例并返回结果字典
+    
+    make_op() 返回一个无参函数，每次调用完成 batch 次操作；计时共调用 calls 次。
+    延迟按单次操作计算（一次调用的用时除以 batch）。峰值内存在单独的一轮中用
+    tracemalloc 统计，调用 memory_calls 次（默认与计时相同），避免拖慢计时。
+    """
+    op = make_op()
+    gc.collect()
+    timings = []
+    started = time.perf_counter()
+    for _ in range(calls):
+        begin = time.perf_counter_ns()
+        op()
+        timings.append((time.perf_counter_ns() - begin) / batch)
+    elapsed = time.perf_counter() - started
+    
+    memory_calls = calls if memory_calls is None else min(memory_calls, calls)
+    op = make_op()
+    gc.collect()
+    tracemalloc.start()
+    try:
+        for _ in range(memory_calls):
+            op()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    
+    timings.sort()
+    operations = calls * batch
+    return {
+        'name': name,
+        'params': params or {},
+        'operations': operations,
+        'seconds': round(elapsed, 6),
+        'ops_per_sec': round(operations / elapsed, 3) if elapsed > 0 else None,
+        'latency_us': {
+            'mean': round(sum(timings) / len(timings) / 1000, 3),
+            'p50': round(percentile(timings, 0.50) / 1000, 3),
+            'p90': round(percentile(timings, 0.90) / 1000, 3),
+            'p99': round(percentile(timings, 0.99) / 1000, 3),
+            'max': round(timings[-1] / 1000, 3),
+        },
+        'peak_memory_kb': round(peak / 1024, 1),
+        'memory_operations': memory_calls * batch,
+    }
+
+
+def environment():
+    return {
+        'python': sys.version.split()[0],
+        'implementation': platform.python_implementation(),
+        'machine': platform.machine(),
+        'system': platform.system(),
+    }
+
+
+def write_report(path, results):
+    report = {'environment': environment(), 'results': results}
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if path == '-':
+        print(text)
+    else:
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(text)
+    return report
+
+
+def load_report(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def compare(results, baseline, threshold):
+    """与基线逐个用例比较，返回回归列表
+    
+    吞吐量比基线低 threshold（如 0.1 表示 10%）以上，或峰值内存比基线高 threshold 以上
+    （且超过 MEMORY_NOISE_KB），视为回归。
+    基线中没有的用例跳过。
+    """
+    baseline_results = {result['name']: result for result in baseline.get('results', [])}
+    regressions = []
+    for result in results:
+        base = baseline_results.get(result['name'])
+        if base is None:
+            continue
+        if base.get('ops_per_sec') and result.get('ops_per_sec') is not None:
+            change = result['ops_per_sec'] / base['ops_per_sec'] - 1
+            if change < -threshold:
+                regressions.append((result['name'], 'ops_per_sec', base['ops_per_sec'], result['ops_per_sec'], change))
+        if base.get('peak_memory_kb') and base.get('memory_operations') == result.get('memory_operations'):
+            change = result['peak_memory_kb'] / base['peak_memory_kb'] - 1
+            if change > threshold and result['peak_memory_kb'] - base['peak_memory_kb'] > MEMORY_NOISE_KB:
+                regressions.append((result['name'], 'peak_memory_kb', base['peak_memory_kb'],
+                                    result['peak_memory_kb'], change))
+    return regressions
@@ -0,0 +1,77 @@
+"""运行基准测试，输出 JSON 结果，可与基线比较
+
+不依赖 Kivy。在仓库根目录运行：
+
+    python benchmarks/run.py -o results.json
+    python benchmarks/run.py --rows 10000,1000000,5000000 --templates 10,10000
+    python benchmarks/run.py --baseline baseline.json --threshold 0.15
+
+指定 --baseline 时，吞吐量下降或峰值内存增长超过阈值的用例会被列出，退出码为 1。
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import bench_pricing
+import bench_templates
+from calculator_logic import ENGINE_FIXED, ENGINES
+from harness import compare, load_report, write_report
+
+
+def _int_list(text):
+    return [int(part) for part in text.split(',') if part.strip()]
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="报价计算与模板存储的基准测试")
+    parser.add_argument('--suite', choices=('all', 'pricing', 'templates'), default='all', help="要运行的用例组")
+    parser.add_argument('--engine', choices=sorted(ENGINES), default=ENGINE_FIXED, help="计算引擎")
+    parser.add_argument('--rows', type=_int_list, default=[10000, 1000000],
+                        help="批量报价的订单行数，逗号分隔，默认 10000,1000000")
+    parser.add_argument('--quote-calls', type=int, default=20000, help="单次报价用例的调用次数")
+    parser.add_argument('--memory-rows', type=int, default=100000, help="批量报价统计峰值内存时处理的行数")
+    parser.add_argument('--templates', type=_int_list, default=[10, 100, 1000, 10000],
+                        help="模板数量，逗号分隔，默认 10,100,1000,10000")
+    parser.add_argument('--backends', default=','.join(bench_templates.BACKENDS),
+                        help="模板存储方式，逗号分隔：json,journal,sqlite")
+    parser.add_argument('--quick', action='store_true', help="缩小规模，用于快速检查")
+    parser.add_argument('-o', '--output', default='-', help="结果 JSON 文件，默认写到标准输出")
+    parser.add_argument('--baseline', help="基线结果 JSON 文件")
+    parser.add_argument('--threshold', type=float, default=0.10, help="回归阈值，0.10 表示 10%%")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.quick:
+        args.rows = [10000]
+        args.quote_calls = 2000
+        args.memory_rows = 10000
+        args.templates = [10, 1000]
+    
+    results = []
+    if args.suite in ('all', 'pricing'):
+        results.extend(bench_pricing.run(args.rows, args.engine, args.quote_calls, args.memory_rows))
+    if args.suite in ('all', 'templates'):
+        backends = [backend for backend in args.backends.split(',') if backend]
+        results.extend(bench_templates.run(args.templates, backends))
+    
+    for result in results:
+        latency = result['latency_us']
+        print(f"{result['name']:<40} {result['ops_per_sec']:>14,.0f} 次/秒  "
+              f"p50 {latency['p50']:>10.1f} us  p99 {latency['p99']:>10.1f} us  "
+              f"峰值内存 {result['peak_memory_kb']:>10.1f} KB", file=sys.stderr)
+    write_report(args.output, results)
+    
+    if not args.baseline:
+        return 0
+    regressions = compare(results, load_report(args.baseline), args.threshold)
+    for name, metric, base, current, change in regressions:
+        print(f"回归：{name} {metric} {base} -> {current}（{change:+.1%}）", file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -7,6 +7,8 @@ source.dir = .
 
 source.include_exts = py,png,jpg,kv,atlas,json
 
+source.exclude_dirs = benchmarks,tests
+
 version = 1.0.0
 
 requirements = python3,kivy,pyjnius
@@ -1,13 +1,803 @@
 import decimal
+import functools
+import math
+import operator
+import threading
+from collections import OrderedDict, namedtuple
 from decimal import Decimal
 
-class CalculatorLogic:
+import instrumentation
+
+ENGINE_DECIMAL = "decimal"
+ENGINE_FIXED = "fixed"
+
+_THOUSANDTH = Decimal('0.001')
+_HUNDRED = Decimal('100')
+_ZERO = Decimal('0')
+
+# Decimal 默认上下文为 28 位有效数字；整数系数小于该上限时 Decimal 乘法不会舍入
+_EXACT_PRODUCT_LIMIT = 10 ** 28
+# 除法 A/B 在 A 小于该上限时，Decimal 的 28 位舍入不会越过千分位的进位点
+_EXACT_DIVIDEND_LIMIT = 10 ** 24
+# 不超过 15 位有效数字的千分位数值，float 与十进制写法一一对应
+_FLOAT_EXACT_UNITS = 10 ** 15
+
+
+def _round3(value):
+    return value.quantize(_THOUSANDTH, rounding=decimal.ROUND_HALF_UP)
+
+
+@functools.lru_cache(maxsize=4096)
+def _cached_decimal(value):
+    return Decimal(str(value))
+
+
+def _to_decimal(value):
+    # 0.0 与 -0.0 在缓存中是同一个键，零值不走缓存以保留符号
+    return _cached_decimal(value) if value else Decimal(str(value))
+
+
+def _material_stage(opening, width, thickness, param_value, material_price, quantity):
+    base = (opening / 100) * (width / 100) * (thickness * 2 / 100) * param_value
+    return _round3(base * material_price), _round3(base * quantity)
+
+
+def _process_stage(opening, quantity, process_param):
+    basic_process_unit_price = (opening / _HUNDRED) * process_param
+    basic_process_fee = basic_process_unit_price * quantity
+    
+    if basic_process_fee < 100:
+        final_process_fee = _HUNDRED
+        final_process_unit_price = final_process_fee / quantity if quantity > 0 else _ZERO
+    else:
+        final_process_fee = basic_process_fee
+        final_process_unit_price = basic_process_unit_price
+    
+    return _round3(final_process_unit_price), _round3(final_process_fee)
+
+
+def _print_stage(quantity, print_param, plate_price):
+    basic_print_fee = print_param * quantity
+    
+    if basic_print_fee < plate_price:
+        final_print_unit_price = plate_price / quantity if quantity > 0 else _ZERO
+        final_print_fee = plate_price
+    else:
+        final_print_unit_price = print_param
+        final_print_fee = basic_print_fee
+    
+    return _round3(final_print_unit_price), _round3(final_print_fee)
+
+
+def _parse_fixed(value):
+    """按 str(value) 的十进制写法拆成 (整数系数, 小数位数, 是否为负)，非有限值返回 None
+    
+    单独记录符号是为了和 Decimal 一样区分 0 与 -0。
+    """
+    if not math.isfinite(value):
+        return None
+    
+    mantissa, _, exponent = str(value).partition('e')
+    integer, _, fraction = mantissa.partition('.')
+    coefficient = int(integer + fraction)
+    places = len(fraction) - int(exponent or 0)
+    if places < 0:
+        coefficient *= 10 ** -places
+        places = 0
+    return coefficient, places, mantissa.startswith('-')
+
+
+_FIXED_CACHE = {}
+_FIXED_CACHE_SIZE = 4096
+
+
+def _to_fixed(value):
+    fixed = _FIXED_CACHE.get(value)
+    # 0.0 与 -0.0 是同一个键，零值不进缓存以保留符号
+    if fixed is None or not value:
+        fixed = _parse_fixed(value)
+        if value:
+            if len(_FIXED_CACHE) >= _FIXED_CACHE_SIZE:
+                _FIXED_CACHE.clear()
+            _FIXED_CACHE[value] = fixed
+    return fixed
+
+
+class _NeedsDecimal(Exception):
+    """结果超出 Decimal 的精度，Decimal 的 quantize 会抛出 InvalidOperation"""
+
+
+def _fixed_to_float(numerator, denominator, negative):
+    """numerator / denominator 按 ROUND_HALF_UP 取到千分位并转为 float，negative 决定结果符号"""
+    quotient, remainder = divmod(abs(numerator) * 1000, denominator)
+    if remainder * 2 >= denominator:
+        quotient += 1
+    if quotient >= _EXACT_PRODUCT_LIMIT:
+        raise _NeedsDecimal
+    return -(quotient / 1000) if negative else quotient / 1000
+
+
+class DecimalEngine:
+    """Decimal 计算引擎：逐步沿用原有的 Decimal(str(float)) 算法，作为结果基准"""
+    name = ENGINE_DECIMAL
+    
+    def material(self, opening, width, thickness, param_value, material_price, quantity):
+        unit_price, weight = _material_stage(
+            _to_decimal(opening), _to_decimal(width), _to_decimal(thickness),
+            _to_decimal(param_value), _to_decimal(material_price), _to_decimal(quantity)
+        )
+        return float(unit_price), float(weight)
+    
+    def process(self, opening, quantity, process_param):
+        unit_price, fee = _process_stage(
+            _to_decimal(opening), _to_decimal(quantity), _to_decimal(process_param)
+        )
+        return float(unit_price), float(fee)
+    
+    def printing(self, quantity, print_param, plate_price):
+        unit_price, fee = _print_stage(
+            _to_decimal(quantity), _to_decimal(print_param), _to_decimal(plate_price)
+        )
+        return float(unit_price), float(fee)
+    
+    def bag_unit_price(self, material_unit_price, process_unit_price, print_unit_price):
+        total = _to_decimal(material_unit_price) + _to_decimal(process_unit_price) + _to_decimal(print_unit_price)
+        return float(_round3(total))
+    
+    def round_price(self, value):
+        return float(_round3(_to_decimal(value)))
+
+
+class FixedPointEngine:
+    """定点整数计算引擎
+    
+    每个输入按其十进制写法表示为整数系数和小数位数，各阶段用整数乘法和
+    整除完成计算，再按 ROUND_HALF_UP 取到千分位。结果与 DecimalEngine
+    完全一致：当系数大到 Decimal 本身会发生舍入，或结果超出 Decimal 精度（Decimal 会抛出
+    InvalidOperation）时，该阶段退回 DecimalEngine 计算。
+    """
+    name = ENGINE_FIXED
+    
     def __init__(self):
+        self._fallback = DecimalEngine()
+    
+    def material(self, opening, width, thickness, param_value, material_price, quantity):
+        try:
+            fixed_opening = _to_fixed(opening)
+            fixed_width = _to_fixed(width)
+            fixed_thickness = _to_fixed(thickness)
+            fixed_param_value = _to_fixed(param_value)
+            fixed_material_price = _to_fixed(material_price)
+            fixed_quantity = _to_fixed(quantity)
+            if (fixed_opening is None or fixed_width is None or fixed_thickness is None
+                    or fixed_param_value is None or fixed_material_price is None or fixed_quantity is None):
+                return self._fallback.material(opening, width, thickness, param_value, material_price, quantity)
+            
+            base = fixed_opening[0] * fixed_width[0] * fixed_thickness[0] * 2 * fixed_param_value[0]
+            base_places = fixed_opening[1] + fixed_width[1] + fixed_thickness[1] + fixed_param_value[1] + 6
+            base_negative = fixed_opening[2] ^ fixed_width[2] ^ fixed_thickness[2] ^ fixed_param_value[2]
+            unit_price = base * fixed_material_price[0]
+            weight = base * fixed_quantity[0]
+            if abs(unit_price) >= _EXACT_PRODUCT_LIMIT or abs(weight) >= _EXACT_PRODUCT_LIMIT:
+                return self._fallback.material(opening, width, thickness, param_value, material_price, quantity)
+            
+            return (
+                _fixed_to_float(unit_price, 10 ** (base_places + fixed_material_price[1]),
+                                base_negative ^ fixed_material_price[2]),
+                _fixed_to_float(weight, 10 ** (base_places + fixed_quantity[1]),
+                                base_negative ^ fixed_quantity[2]),
+            )
+        except _NeedsDecimal:
+            return self._fallback.material(opening, width, thickness, param_value, material_price, quantity)
+    
+    def process(self, opening, quantity, process_param):
+        try:
+            fixed_opening = _to_fixed(opening)
+            fixed_quantity = _to_fixed(quantity)
+            fixed_process_param = _to_fixed(process_param)
+            if fixed_opening is None or fixed_quantity is None or fixed_process_param is None:
+                return self._fallback.process(opening, quantity, process_param)
+            
+            quantity_coefficient, quantity_places, quantity_negative = fixed_quantity
+            basic_unit_price = fixed_opening[0] * fixed_process_param[0]
+            unit_price_places = fixed_opening[1] + fixed_process_param[1] + 2
+            unit_price_negative = fixed_opening[2] ^ fixed_process_param[2]
+            basic_fee = basic_unit_price * quantity_coefficient
+            fee_places = unit_price_places + quantity_places
+            if abs(basic_fee) >= _EXACT_PRODUCT_LIMIT:
+                return self._fallback.process(opening, quantity, process_param)
+            
+            if basic_fee < 100 * 10 ** fee_places:
+                if quantity_coefficient > 0:
+                    dividend = 100 * 10 ** quantity_places
+                    if dividend >= _EXACT_DIVIDEND_LIMIT:
+                        return self._fallback.process(opening, quantity, process_param)
+                    unit_price = _fixed_to_float(dividend, quantity_coefficient, False)
+                else:
+                    unit_price = 0.0
+                return unit_price, 100.0
+            
+            return (
+                _fixed_to_float(basic_unit_price, 10 ** unit_price_places, unit_price_negative),
+                _fixed_to_float(basic_fee, 10 ** fee_places, unit_price_negative ^ quantity_negative),
+            )
+        except _NeedsDecimal:
+            return self._fallback.process(opening, quantity, process_param)
+    
+    def printing(self, quantity, print_param, plate_price):
+        try:
+            fixed_quantity = _to_fixed(quantity)
+            fixed_print_param = _to_fixed(print_param)
+            fixed_plate_price = _to_fixed(plate_price)
+            if fixed_quantity is None or fixed_print_param is None or fixed_plate_price is None:
+                return self._fallback.printing(quantity, print_param, plate_price)
+            
+            quantity_coefficient, quantity_places, quantity_negative = fixed_quantity
+            print_param_coefficient, print_param_places, print_param_negative = fixed_print_param
+            plate_price_coefficient, plate_price_places, plate_price_negative = fixed_plate_price
+            basic_fee = print_param_coefficient * quantity_coefficient
+            fee_places = print_param_places + quantity_places
+            if abs(basic_fee) >= _EXACT_PRODUCT_LIMIT:
+                return self._fallback.printing(quantity, print_param, plate_price)
+            
+            if basic_fee * 10 ** plate_price_places < plate_price_coefficient * 10 ** fee_places:
+                if quantity_coefficient > 0:
+                    dividend = plate_price_coefficient * 10 ** quantity_places
+                    if abs(dividend) >= _EXACT_DIVIDEND_LIMIT:
+                        return self._fallback.printing(quantity, print_param, plate_price)
+                    unit_price = _fixed_to_float(dividend, quantity_coefficient * 10 ** plate_price_places,
+                                                 plate_price_negative)
+                else:
+                    unit_price = 0.0
+                return unit_price, _fixed_to_float(plate_price_coefficient, 10 ** plate_price_places,
+                                                   plate_price_negative)
+            
+            return (
+                _fixed_to_float(print_param_coefficient, 10 ** print_param_places, print_param_negative),
+                _fixed_to_float(basic_fee, 10 ** fee_places, print_param_negative ^ quantity_negative),
+            )
+        except _NeedsDecimal:
+            return self._fallback.printing(quantity, print_param, plate_price)
+    
+    def bag_unit_price(self, material_unit_price, process_unit_price, print_unit_price):
+        try:
+            # 各阶段结果本身就是千分位的 float，能精确还原成千分位整数时直接相加
+            try:
+                material_units = round(material_unit_price * 1000)
+                process_units = round(process_unit_price * 1000)
+                print_units = round(print_unit_price * 1000)
+            except (ValueError, OverflowError):
+                return self._fallback.bag_unit_price(material_unit_price, process_unit_price, print_unit_price)
+            
+            if (material_units / 1000 == material_unit_price and process_units / 1000 == process_unit_price
+                    and print_units / 1000 == print_unit_price
+                    and abs(material_units) + abs(process_units) + abs(print_units) < _FLOAT_EXACT_UNITS):
+                total = material_units + process_units + print_units
+                if total:
+                    return total / 1000
+                # 与 Decimal 加法一致：和为零时只有三项都是 -0 才得到 -0
+                negative = all(math.copysign(1, value) < 0
+                               for value in (material_unit_price, process_unit_price, print_unit_price))
+                return -0.0 if negative else 0.0
+            
+            parts = (_to_fixed(material_unit_price), _to_fixed(process_unit_price), _to_fixed(print_unit_price))
+            places = max(part[1] for part in parts)
+            first, second, third = (coefficient * 10 ** (places - part_places) for coefficient, part_places, _ in parts)
+            total = first + second + third
+            # Decimal 逐次相加，前两项之和超出精度时已经舍入
+            if abs(first + second) >= _EXACT_PRODUCT_LIMIT or abs(total) >= _EXACT_PRODUCT_LIMIT:
+                return self._fallback.bag_unit_price(material_unit_price, process_unit_price, print_unit_price)
+            negative = total < 0 if total else all(part[2] for part in parts)
+            return _fixed_to_float(total, 10 ** places, negative)
+        except _NeedsDecimal:
+            return self._fallback.bag_unit_price(material_unit_price, process_unit_price, print_unit_price)
+    
+    def round_price(self, value):
+        try:
+            fixed = _to_fixed(value)
+            if fixed is None:
+                return self._fallback.round_price(value)
+            return _fixed_to_float(fixed[0], 10 ** fixed[1], fixed[2])
+        except _NeedsDecimal:
+            return self._fallback.round_price(value)
+
+
+# 引擎本身无状态，可在线程间共享
+ENGINES = {
+    ENGINE_DECIMAL: DecimalEngine(),
+    ENGINE_FIXED: FixedPointEngine(),
+}
+
+
+def get_engine(engine):
+    """按名称取得计算引擎实例；传入引擎实例时原样返回"""
+    if not isinstance(engine, str):
+        return engine
+    if engine not in ENGINES:
+        raise ValueError(f"未知的计算引擎：{engine}")
+    return ENGINES[engine]
+
+
+class QuoteInput(namedtuple('QuoteInput', [
+    'opening', 'width', 'thickness', 'param_value', 'material_price', 'quantity',
+    'process_param', 'print_param', 'material_type',
+    'material_enabled', 'process_enabled', 'print_enabled',
+    'material_type_price_copper', 'material_type_price_rubber',
+])):
+    """一次报价的全部输入，不可变，可作为字典键"""
+    __slots__ = ()
+    
+    @classmethod
+    def from_values(cls, opening, width, thickness, param_value, material_price,
+                    quantity, process_param, print_param, material_type,
+                    material_enabled=True, process_enabled=True, print_enabled=True,
+                    material_type_price_copper=100, material_type_price_rubber=50):
+        """按 set_values 的规则把界面或文件中的原始值规范化"""
+        return cls(
+            float(opening or 0), float(width or 0), float(thickness or 0),
+            float(param_value or 0.95), float(material_price or 9), float(quantity or 0),
+            float(process_param or 0.2), float(print_param or 0.015), material_type or "铜板",
+            bool(material_enabled), bool(process_enabled), bool(print_enabled),
+            float(material_type_price_copper), float(material_type_price_rubber),
+        )
+    
+    @property
+    def plate_price(self):
+        if self.material_type == "铜板":
+            return self.material_type_price_copper
+        return self.material_type_price_rubber
+
+
+class TemplateParams(namedtuple('TemplateParams', [
+    'param_value', 'material_price', 'process_param', 'print_param', 'material_type',
+    'material_type_price_copper', 'material_type_price_rubber',
+    'material_enabled', 'process_enabled', 'print_enabled',
+])):
+    """模板设置解析后的参数，不可变；数值为 float，开关为 bool"""
+    __slots__ = ()
+    
+    @classmethod
+    def from_settings(cls, settings, strict=True):
+        """校验并解析模板设置；空值按 set_values 的默认值处理
+        
+        无法解析的数值抛出 ValueError；strict 为 False 时改用默认值，用于仍要打开旧模板的场合。
+        """
+        def number(field, default):
+            value = settings.get(field)
+            if not value:
+                return float(default)
+            try:
+                result = float(value)
+            except (TypeError, ValueError):
+                result = math.nan
+            if not math.isfinite(result):
+                if not strict:
+                    return float(default)
+                raise ValueError(f"模板参数 {field} 不是有效数字：{value}")
+            return result
+        
+        return cls(
+            number('param_value', 0.95), number('material_price', 9),
+            number('process_param', 0.2), number('print_param', 0.015),
+            settings.get('material_type') or "铜板",
+            number('material_type_price_copper', 100), number('material_type_price_rubber', 50),
+            bool(settings.get('material_enabled', True)),
+            bool(settings.get('process_enabled', True)),
+            bool(settings.get('print_enabled', True)),
+        )
+    
+    @property
+    def plate_price(self):
+        if self.material_type == "铜板":
+            return self.material_type_price_copper
+        return self.material_type_price_rubber
+    
+    def quote_input(self, opening, width, thickness, quantity):
+        """用模板参数和规格、个数组成 QuoteInput"""
+        return QuoteInput(
+            float(opening or 0), float(width or 0), float(thickness or 0),
+            self.param_value, self.material_price, float(quantity or 0),
+            self.process_param, self.print_param, self.material_type,
+            self.material_enabled, self.process_enabled, self.print_enabled,
+            self.material_type_price_copper, self.material_type_price_rubber,
+        )
+
+
+class Quote:
+    """一次报价的结果；创建后只读，可在线程间共享
+    
+    计算算式文本在第一次访问 detail_text 或调用 explain() 时才生成。
+    """
+    __slots__ = (
+        'inputs', 'material_unit_price', 'material_weight', 'process_unit_price', 'process_fee',
+        'print_unit_price', 'print_fee', 'bag_unit_price', 'material_type_price', '_detail_text',
+    )
+    
+    def __init__(self, inputs, material_unit_price, material_weight, process_unit_price, process_fee,
+                 print_unit_price, print_fee, bag_unit_price, material_type_price, detail=True):
+        self.inputs = inputs
+        self.material_unit_price = material_unit_price
+        self.material_weight = material_weight
+        self.process_unit_price = process_unit_price
+        self.process_fee = process_fee
+        self.print_unit_price = print_unit_price
+        self.print_fee = print_fee
+        self.bag_unit_price = bag_unit_price
+        self.material_type_price = material_type_price
+        # None 表示尚未生成；关闭算式时固定为空字符串
+        self._detail_text = None if detail else ""
+    
+    def __repr__(self):
+        return (f"Quote(spec={self.spec!r}, quantity={self.inputs.quantity!r}, "
+                f"bag_unit_price={self.bag_unit_price!r})")
+    
+    @property
+    def spec(self):
+        inputs = self.inputs
+        opening_str = str(inputs.opening) if inputs.opening != 0 else "0"
+        width_str = str(inputs.width) if inputs.width != 0 else "0"
+        thickness_str = str(inputs.thickness) if inputs.thickness != 0 else "0"
+        return f"{opening_str} * {width_str}    {thickness_str}C"
+    
+    @property
+    def total_fee(self):
+        return self.material_unit_price * self.inputs.quantity + self.process_fee + self.print_fee
+    
+    @property
+    def detail_text(self):
+        if self._detail_text is None:
+            # 并发访问时可能重复生成，但结果相同，无需加锁
+            if instrumentation.enabled:
+                started = instrumentation.clock()
+                self._detail_text = _format_detail(self)
+                instrumentation.record("quote.detail_text", instrumentation.clock() - started)
+            else:
+                self._detail_text = _format_detail(self)
+        return self._detail_text
+    
+    def explain(self):
+        """返回计算算式文本"""
+        return self.detail_text
+
+
+def _format_detail(result):
+    inputs = result.inputs
+    unit_price = result.material_unit_price
+    weight = result.material_weight
+    process_unit_price = result.process_unit_price
+    process_fee = result.process_fee
+    print_unit_price = result.print_unit_price
+    print_fee = result.print_fee
+    bag_unit_price = result.bag_unit_price
+    
+    opening_str = str(inputs.opening) if inputs.opening != 0 else "0"
+    width_str = str(inputs.width) if inputs.width != 0 else "0"
+    thickness_str = str(inputs.thickness) if inputs.thickness != 0 else "0"
+    param_value_str = str(inputs.param_value)
+    material_price_str = str(inputs.material_price)
+    quantity_str = str(inputs.quantity) if inputs.quantity != 0 else "0"
+    process_param_str = str(inputs.process_param)
+    print_param_str = str(inputs.print_param)
+    material_type_price_str = f"{result.material_type_price:.3f}"
+    
+    return f"""=== 计算算式 ===
+
+原料计算：
+- 原料单价 = ({opening_str}/100) × ({width_str}/100) × ({thickness_str}×2/100) × {param_value_str} × {material_price_str} = {unit_price:.3f} 元/个
+- 原料重量 = ({opening_str}/100) × ({width_str}/100) × ({thickness_str}×2/100) × {param_value_str} × {quantity_str} = {weight:.3f} 公斤
+
+加工计算：
+- 加工单价 = ({opening_str}/100) × {process_param_str} = {process_unit_price:.3f} 元/个
+- 加工费 = {process_unit_price:.3f} × {quantity_str} = {process_fee:.3f} 元（最低100元）
+
+印刷计算：
+- 印刷单价 = {print_param_str} = {print_unit_price:.3f} 元/个
+- 印刷费 = {print_unit_price:.3f} × {quantity_str} = {print_fee:.3f} 元（最低{material_type_price_str}元）
+
+单袋单价 = {unit_price:.3f} + {process_unit_price:.3f} + {print_unit_price:.3f} = {bag_unit_price:.3f} 元/个
+"""
+
+
+class QuoteResult(dict):
+    """calculate_all 返回的结果字典，'detail_text' 在第一次读取时才生成
+    
+    'detail_text' 始终算作字典中的键：in、len() 不会生成算式；遍历、keys() / items() / values()、
+    copy()、比较以及 dict(result)、json.dumps(result) 会先生成算式，结果与普通字典相同。
+    """
+    
+    def __init__(self, result, **fields):
+        super().__init__(**fields)
+        self.quote = result
+        # 'detail_text' 尚未生成、也没有被删除或改写
+        self._lazy = True
+    
+    def _fill(self):
+        if self._lazy:
+            self._lazy = False
+            if not dict.__contains__(self, 'detail_text'):
+                dict.__setitem__(self, 'detail_text', self.quote.detail_text)
+    
+    def __missing__(self, key):
+        if key != 'detail_text' or not self._lazy:
+            raise KeyError(key)
+        self._fill()
+        return dict.__getitem__(self, key)
+    
+    def get(self, key, default=None):
+        if key == 'detail_text' and self._lazy:
+            self._fill()
+        return super().get(key, default)
+    
+    def __setitem__(self, key, value):
+        if key == 'detail_text':
+            self._lazy = False
+        super().__setitem__(key, value)
+    
+    def __delitem__(self, key):
+        self._fill()
+        super().__delitem__(key)
+    
+    def __contains__(self, key):
+        return (key == 'detail_text' and self._lazy) or super().__contains__(key)
+    
+    def __len__(self):
+        lazy = self._lazy and not dict.__contains__(self, 'detail_text')
+        return super().__len__() + (1 if lazy else 0)
+    
+    def __iter__(self):
+        self._fill()
+        return super().__iter__()
+    
+    def __reversed__(self):
+        self._fill()
+        return super().__reversed__()
+    
+    def __eq__(self, other):
+        self._fill()
+        if isinstance(other, QuoteResult):
+            other._fill()
+        return super().__eq__(other)
+    
+    def __ne__(self, other):
+        return not self == other
+    
+    __hash__ = None
+    
+    def __repr__(self):
+        self._fill()
+        return super().__repr__()
+    
+    def keys(self):
+        self._fill()
+        return super().keys()
+    
+    def items(self):
+        self._fill()
+        return super().items()
+    
+    def values(self):
+        self._fill()
+        return super().values()
+    
+    def copy(self):
+        self._fill()
+        return dict(super().items())
+    
+    def pop(self, key, *default):
+        self._fill()
+        return super().pop(key, *default)
+    
+    def popitem(self):
+        self._fill()
+        return super().popitem()
+    
+    def setdefault(self, key, default=None):
+        self._fill()
+        return super().setdefault(key, default)
+    
+    def update(self, *args, **kwargs):
+        self._fill()
+        super().update(*args, **kwargs)
+    
+    def clear(self):
+        self._lazy = False
+        super().clear()
+
+
+# 各计算阶段依赖的输入字段；字段不变时阶段结果可以直接复用
+STAGE_DEPENDENCIES = {
+    'material': ('material_enabled', 'opening', 'width', 'thickness', 'param_value',
+                 'material_price', 'quantity'),
+    'process': ('process_enabled', 'opening', 'quantity', 'process_param'),
+    'print': ('print_enabled', 'quantity', 'print_param', 'material_type',
+              'material_type_price_copper', 'material_type_price_rubber'),
+}
+
+_STAGE_KEYS = {
+    stage: operator.itemgetter(*(QuoteInput._fields.index(field) for field in fields))
+    for stage, fields in STAGE_DEPENDENCIES.items()
+}
+_MATERIAL_KEY = _STAGE_KEYS['material']
+_PROCESS_KEY = _STAGE_KEYS['process']
+_PRINT_KEY = _STAGE_KEYS['print']
+
+
+def _record_stage(name, started):
+    """记录从 started 到现在的耗时，返回当前时间作为下一阶段的起点"""
+    now = instrumentation.clock()
+    instrumentation.record(name, now - started)
+    return now
+
+
+def quote(inputs, engine=ENGINE_DECIMAL, detail=True, previous=None):
+    """按输入计算一次报价，返回 Quote
+    
+    结果只取决于参数，可以在多个线程中并发调用。会用到的共享状态：
+    - 定点引擎的 _FIXED_CACHE 和 Decimal 引擎的 lru_cache 缓存输入的解析结果。前者是不加锁的普通字典，
+      并发时最多重复解析或提前清空，缓存的值只由输入决定，不影响结果；lru_cache 自身线程安全。
+    - 统计打开时向 instrumentation 记录各阶段耗时，记录时持有该模块的锁。
+    - Decimal 运算使用调用线程的 decimal 上下文，该上下文需保持默认的 28 位精度。
+    detail 为 False 时不生成计算算式，适合批量报价。
+    传入上一次的 Quote 作为 previous 时按 STAGE_DEPENDENCIES 增量计算：
+    依赖字段没有变化的阶段直接复用上一次已取整的结果。
+    """
+    engine = get_engine(engine)
+    quantity = inputs.quantity
+    previous_inputs = previous.inputs if previous is not None else None
+    recomputed = False
+    timed = instrumentation.enabled
+    if timed:
+        started = instrumentation.clock()
+    
+    if previous_inputs is not None and _MATERIAL_KEY(inputs) == _MATERIAL_KEY(previous_inputs):
+        material_unit_price = previous.material_unit_price
+        material_weight = previous.material_weight
+    elif inputs.material_enabled:
+        material_unit_price, material_weight = engine.material(
+            inputs.opening, inputs.width, inputs.thickness,
+            inputs.param_value, inputs.material_price, quantity
+        )
+        material_weight = engine.round_price(material_weight)
+        recomputed = True
+    else:
+        material_unit_price = material_weight = 0.0
+        recomputed = True
+    if timed:
+        started = _record_stage("quote.material", started)
+    
+    if previous_inputs is not None and _PROCESS_KEY(inputs) == _PROCESS_KEY(previous_inputs):
+        process_unit_price = previous.process_unit_price
+        process_fee = previous.process_fee
+    elif inputs.process_enabled:
+        process_unit_price, process_fee = engine.process(inputs.opening, quantity, inputs.process_param)
+        recomputed = True
+    else:
+        process_unit_price = process_fee = 0.0
+        recomputed = True
+    if timed:
+        started = _record_stage("quote.process", started)
+    
+    if previous_inputs is not None and _PRINT_KEY(inputs) == _PRINT_KEY(previous_inputs):
+        material_type_price = previous.material_type_price
+        print_unit_price = previous.print_unit_price
+        print_fee = previous.print_fee
+    else:
+        plate_price = inputs.plate_price
+        material_type_price = engine.round_price(plate_price)
+        if inputs.print_enabled:
+            print_unit_price, print_fee = engine.printing(quantity, inputs.print_param, plate_price)
+        else:
+            print_unit_price = print_fee = 0.0
+        recomputed = True
+    if timed:
+        _record_stage("quote.print", started)
+    
+    if recomputed:
+        bag_unit_price = engine.bag_unit_price(material_unit_price, process_unit_price, print_unit_price)
+    else:
+        bag_unit_price = previous.bag_unit_price
+    
+    return Quote(
+        inputs, material_unit_price, material_weight, process_unit_price, process_fee,
+        print_unit_price, print_fee, bag_unit_price, material_type_price, detail,
+    )
+
+
+class QuoteCache:
+    """报价结果的 LRU 缓存
+    
+    以 QuoteInput（包含启用开关和版材价格）加上是否生成算式作为键，数值相等的
+    输入视为同一个键。超过 maxsize 时淘汰最久未使用的条目。可以在线程间共享。
+    """
+    
+    def __init__(self, maxsize=1024):
+        if maxsize <= 0:
+            raise ValueError("缓存容量必须大于 0")
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def __len__(self):
+        return len(self._entries)
+    
+    def get(self, inputs, detail=True):
+        """取出缓存的 Quote，未命中时返回 None"""
+        key = (inputs, detail)
+        with self._lock:
+            result = self._entries.get(key)
+            if result is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return result
+    
+    def put(self, result, detail=True):
+        """放入一个 Quote，必要时淘汰最久未使用的条目"""
+        key = (result.inputs, detail)
+        with self._lock:
+            self._entries[key] = result
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+    
+    def quote(self, inputs, engine=ENGINE_DECIMAL, detail=True):
+        """带缓存的 quote()"""
+        result = self.get(inputs, detail)
+        if result is None:
+            result = quote(inputs, engine, detail)
+            self.put(result, detail)
+        return result
+    
+    def clear(self):
+        """清空缓存条目，命中统计保留"""
+        with self._lock:
+            self._entries.clear()
+    
+    def stats(self):
+        """返回命中统计"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0,
+            }
+    
+    def bind_template_manager(self, template_manager):
+        """模板设置通过 TemplateManager.update_template 修改后自动清空缓存"""
+        template_manager.add_listener(self._on_template_changed)
+    
+    def _on_template_changed(self, event, name):
+        if event == 'update':
+            self.clear()
+
+
+def _column(values, default, size):
+    """把标量或列统一成长度为 size 的列，并按 set_values 的规则转换为 float"""
+    if values is None or isinstance(values, (str, int, float)):
+        value = float(values or default)
+        return [value] * size
+    
+    column = [float(value or default) for value in values]
+    if len(column) != size:
+        raise ValueError(f"列长度不一致：期望 {size} 行，实际 {len(column)} 行")
+    return column
+
+
+class CalculatorLogic:
+    def __init__(self, engine=ENGINE_DECIMAL):
+        self.engine = get_engine(engine)
         self.material_enabled = True
         self.process_enabled = True
         self.print_enabled = True
         self.default_material_type_price_copper = 100
         self.default_material_type_price_rubber = 50
+        self.params = None
         
         self.opening = 0
         self.width = 0
@@ -28,7 +818,13 @@ class CalculatorLogic:
         self.bag_unit_price = 0
         self.material_type_price = 0
         
-        self.detail_text = ""
+        # 关闭后不再生成计算算式，适合批量报价
+        self.detail_enabled = True
+        # 开启后只重新计算依赖字段发生变化的阶段
+        self.incremental = False
+        # QuoteCache 实例；为 None 时不缓存
+        self.quote_cache = None
+        self.last_quote = None
     
     def set_values(self, opening, width, thickness, param_value, material_price, 
                    quantity, process_param, print_param, material_type):
@@ -42,19 +838,34 @@ class CalculatorLogic:
         self.print_param = float(print_param or 0.015)
         self.material_type = material_type or "铜板"
     
+    def apply_params(self, params):
+        """应用模板参数：启用开关和版材价格立即生效，参数值等作为 set_params_values 的默认值"""
+        self.params = params
+        self.material_enabled = params.material_enabled
+        self.process_enabled = params.process_enabled
+        self.print_enabled = params.print_enabled
+        self.default_material_type_price_copper = params.material_type_price_copper
+        self.default_material_type_price_rubber = params.material_type_price_rubber
+    
+    def set_params_values(self, opening, width, thickness, quantity, param_value=None, material_price=None,
+                          process_param=None, print_param=None, material_type=None):
+        """设置规格和个数；其余参数为 None 时直接使用 apply_params 中已解析的模板参数"""
+        params = self.params
+        self.opening = float(opening or 0)
+        self.width = float(width or 0)
+        self.thickness = float(thickness or 0)
+        self.quantity = float(quantity or 0)
+        self.param_value = params.param_value if param_value is None else float(param_value or 0.95)
+        self.material_price = params.material_price if material_price is None else float(material_price or 9)
+        self.process_param = params.process_param if process_param is None else float(process_param or 0.2)
+        self.print_param = params.print_param if print_param is None else float(print_param or 0.015)
+        self.material_type = (params.material_type if material_type is None else material_type) or "铜板"
+    
     def calculate_material(self):
-        opening = Decimal(str(self.opening))
-        width = Decimal(str(self.width))
-        thickness = Decimal(str(self.thickness))
-        param_value = Decimal(str(self.param_value))
-        material_price = Decimal(str(self.material_price))
-        quantity = Decimal(str(self.quantity))
-        
-        unit_price = (opening / 100) * (width / 100) * (thickness * 2 / 100) * param_value * material_price
-        total_weight = (opening / 100) * (width / 100) * (thickness * 2 / 100) * param_value * quantity
-        
-        rounded_unit_price = float(unit_price.quantize(Decimal('0.001'), rounding=decimal.ROUND_HALF_UP))
-        rounded_total_weight = float(total_weight.quantize(Decimal('0.001'), rounding=decimal.ROUND_HALF_UP))
+        rounded_unit_price, rounded_total_weight = self.engine.material(
+            self.opening, self.width, self.thickness,
+            self.param_value, self.material_price, self.quantity
+        )
         
         self.material_unit_price = rounded_unit_price
         self.material_weight = rounded_total_weight
@@ -62,22 +873,9 @@ class CalculatorLogic:
         return rounded_unit_price, rounded_total_weight
     
     def calculate_process(self):
-        opening = Decimal(str(self.opening))
-        quantity = Decimal(str(self.quantity))
-        process_param = Decimal(str(self.process_param))
-        
-        basic_process_unit_price = (opening / Decimal('100')) * process_param
-        basic_process_fee = basic_process_unit_price * quantity
-        
-        if basic_process_fee < 100:
-            final_process_fee = Decimal('100')
-            final_process_unit_price = final_process_fee / quantity if quantity > 0 else Decimal('0')
-        else:
-            final_process_fee = basic_process_fee
-            final_process_unit_price = basic_process_unit_price
-        
-        rounded_final_process_unit_price = float(final_process_unit_price.quantize(Decimal('0.001'), rounding=decimal.ROUND_HALF_UP))
-        rounded_final_process_fee = float(final_process_fee.quantize(Decimal('0.001'), rounding=decimal.ROUND_HALF_UP))
+        rounded_final_process_unit_price, rounded_final_process_fee = self.engine.process(
+            self.opening, self.quantity, self.process_param
+        )
         
         self.process_unit_price = rounded_final_process_unit_price
         self.process_fee = rounded_final_process_fee
@@ -85,125 +883,183 @@ class CalculatorLogic:
         return rounded_final_process_fee
     
     def calculate_print(self):
-        quantity = Decimal(str(self.quantity))
-        print_param = Decimal(str(self.print_param))
-        material_type = self.material_type
-        
-        basic_print_unit_price = print_param
-        basic_print_fee = basic_print_unit_price * quantity
-        
-        if material_type == "铜板":
-            material_price = Decimal(str(self.default_material_type_price_copper))
+        if self.material_type == "铜板":
+            material_price = self.default_material_type_price_copper
         else:
-            material_price = Decimal(str(self.default_material_type_price_rubber))
+            material_price = self.default_material_type_price_rubber
         
-        rounded_material_price = float(material_price.quantize(Decimal('0.001'), rounding=decimal.ROUND_HALF_UP))
-        self.material_type_price = rounded_material_price
+        self.material_type_price = self.engine.round_price(material_price)
         
-        if basic_print_fee < material_price:
-            final_print_unit_price = material_price / quantity if quantity > 0 else Decimal('0')
-            final_print_fee = material_price
-        else:
-            final_print_unit_price = basic_print_unit_price
-            final_print_fee = basic_print_fee
-        
-        rounded_final_print_unit_price = float(final_print_unit_price.quantize(Decimal('0.001'), rounding=decimal.ROUND_HALF_UP))
-        rounded_final_print_fee = float(final_print_fee.quantize(Decimal('0.001'), rounding=decimal.ROUND_HALF_UP))
+        rounded_final_print_unit_price, rounded_final_print_fee = self.engine.printing(
+            self.quantity, self.print_param, material_price
+        )
         
         self.print_unit_price = rounded_final_print_unit_price
         self.print_fee = rounded_final_print_fee
         
         return rounded_final_print_fee
     
+    def enable_cache(self, maxsize=1024):
+        """为 calculate_all 开启 LRU 报价缓存，返回 QuoteCache"""
+        self.quote_cache = QuoteCache(maxsize)
+        return self.quote_cache
+    
+    def get_quote_input(self):
+        """把当前实例上的参数打包成不可变的 QuoteInput"""
+        return QuoteInput(
+            self.opening, self.width, self.thickness, self.param_value, self.material_price,
+            self.quantity, self.process_param, self.print_param, self.material_type,
+            self.material_enabled, self.process_enabled, self.print_enabled,
+            self.default_material_type_price_copper, self.default_material_type_price_rubber,
+        )
+    
+    def apply_quote(self, result):
+        """把 Quote 的结果写回实例属性，保持原有属性接口"""
+        self.material_unit_price = result.material_unit_price
+        self.material_weight = result.material_weight
+        self.process_unit_price = result.process_unit_price
+        self.process_fee = result.process_fee
+        self.print_unit_price = result.print_unit_price
+        self.print_fee = result.print_fee
+        self.bag_unit_price = result.bag_unit_price
+        self.material_type_price = result.material_type_price
+        self.last_quote = result
+    
+    @property
+    def detail_text(self):
+        if self.last_quote is None:
+            return ""
+        return self.last_quote.detail_text
+    
     def calculate_all(self):
+        timed = instrumentation.enabled
+        if timed:
+            started = instrumentation.clock()
         try:
-            if self.material_enabled:
-                unit_price, weight = self.calculate_material()
-            else:
-                unit_price = 0.0
-                weight = 0.0
-                self.material_unit_price = 0.0
-                self.material_weight = 0.0
-            
-            if self.process_enabled:
-                process_fee = self.calculate_process()
-                process_unit_price = self.process_unit_price
-            else:
-                process_fee = 0.0
-                process_unit_price = 0.0
-                self.process_unit_price = 0.0
-                self.process_fee = 0.0
-            
-            if self.print_enabled:
-                print_fee = self.calculate_print()
-                print_unit_price = self.print_unit_price
-            else:
-                print_fee = 0.0
-                print_unit_price = 0.0
-                self.print_unit_price = 0.0
-                self.print_fee = 0.0
-            
-            unit_price_decimal = Decimal(str(unit_price))
-            process_unit_price_decimal = Decimal(str(process_unit_price))
-            print_unit_price_decimal = Decimal(str(print_unit_price))
-            
-            bag_unit_price_decimal = unit_price_decimal + process_unit_price_decimal + print_unit_price_decimal
-            bag_unit_price = float(bag_unit_price_decimal.quantize(Decimal('0.001'), rounding=decimal.ROUND_HALF_UP))
-            
-            weight_decimal = Decimal(str(weight))
-            rounded_weight = float(weight_decimal.quantize(Decimal('0.001'), rounding=decimal.ROUND_HALF_UP))
-            
-            self.bag_unit_price = bag_unit_price
-            self.material_weight = rounded_weight
-            
-            opening_str = str(self.opening) if self.opening != 0 else "0"
-            width_str = str(self.width) if self.width != 0 else "0"
-            thickness_str = str(self.thickness) if self.thickness != 0 else "0"
-            param_value_str = str(self.param_value)
-            material_price_str = str(self.material_price)
-            quantity_str = str(self.quantity) if self.quantity != 0 else "0"
-            process_param_str = str(self.process_param)
-            print_param_str = str(self.print_param)
-            material_type_price_str = f"{self.material_type_price:.3f}"
-            
-            spec = f"{opening_str} * {width_str}    {thickness_str}C"
+            inputs = self.get_quote_input()
+            cache = self.quote_cache
+            result = cache.get(inputs, self.detail_enabled) if cache is not None else None
+            if result is None:
+                previous = self.last_quote if self.incremental else None
+                result = quote(inputs, self.engine, self.detail_enabled, previous)
+                if cache is not None:
+                    cache.put(result, self.detail_enabled)
+            self.apply_quote(result)
+            if timed:
+                instrumentation.record("calculator.total", instrumentation.clock() - started)
             
-            detail_text = f"""=== 计算算式 ===
-
-原料计算：
-- 原料单价 = ({opening_str}/100) × ({width_str}/100) × ({thickness_str}×2/100) × {param_value_str} × {material_price_str} = {unit_price:.3f} 元/个
-- 原料重量 = ({opening_str}/100) × ({width_str}/100) × ({thickness_str}×2/100) × {param_value_str} × {quantity_str} = {weight:.3f} 公斤
-
-加工计算：
-- 加工单价 = ({opening_str}/100) × {process_param_str} = {process_unit_price:.3f} 元/个
-- 加工费 = {process_unit_price:.3f} × {quantity_str} = {process_fee:.3f} 元（最低100元）
-
-印刷计算：
-- 印刷单价 = {print_param_str} = {print_unit_price:.3f} 元/个
-- 印刷费 = {print_unit_price:.3f} × {quantity_str} = {print_fee:.3f} 元（最低{material_type_price_str}元）
-
-单袋单价 = {unit_price:.3f} + {process_unit_price:.3f} + {print_unit_price:.3f} = {bag_unit_price:.3f} 元/个
-"""
-            
-            self.detail_text = detail_text
-            
-            return {
-                'spec': spec,
-                'bag_unit_price': bag_unit_price,
-                'material_weight': rounded_weight,
-                'material_unit_price': self.material_unit_price,
-                'material_weight_display': self.material_weight,
-                'process_unit_price': self.process_unit_price,
-                'process_fee': self.process_fee,
-                'print_unit_price': self.print_unit_price,
-                'print_fee': self.print_fee,
-                'material_type_price': self.material_type_price,
-                'detail_text': detail_text
-            }
+            return QuoteResult(
+                result,
+                spec=result.spec,
+                bag_unit_price=result.bag_unit_price,
+                material_weight=result.material_weight,
+                material_unit_price=result.material_unit_price,
+                material_weight_display=result.material_weight,
+                process_unit_price=result.process_unit_price,
+                process_fee=result.process_fee,
+                print_unit_price=result.print_unit_price,
+                print_fee=result.print_fee,
+                material_type_price=result.material_type_price,
+            )
             
         except Exception as e:
             raise Exception(f"计算过程中发生错误：{str(e)}")
     
+    def calculate_batch(self, openings, widths, thicknesses, quantities,
+                        param_values=None, material_prices=None, process_params=None,
+                        print_params=None, material_types=None):
+        """按列批量计算，结果与逐行 set_values + calculate_all 一致
+        
+        开口、宽度、厚度、个数为等长的列；其余参数可以是列、标量，
+        或 None（沿用当前实例上的参数）。启用开关、版材价格和计算引擎取自当前实例。
+        不生成计算算式文本，返回以结果字段为键的列字典。
+        """
+        openings = _column(openings, 0, len(openings))
+        size = len(openings)
+        widths = _column(widths, 0, size)
+        thicknesses = _column(thicknesses, 0, size)
+        quantities = _column(quantities, 0, size)
+        param_values = _column(
+            self.param_value if param_values is None else param_values, 0.95, size)
+        material_prices = _column(
+            self.material_price if material_prices is None else material_prices, 9, size)
+        process_params = _column(
+            self.process_param if process_params is None else process_params, 0.2, size)
+        print_params = _column(
+            self.print_param if print_params is None else print_params, 0.015, size)
+        
+        if material_types is None or isinstance(material_types, str):
+            material_types = [material_types or self.material_type] * size
+        else:
+            material_types = [material_type or "铜板" for material_type in material_types]
+            if len(material_types) != size:
+                raise ValueError(f"列长度不一致：期望 {size} 行，实际 {len(material_types)} 行")
+        
+        engine = self.engine
+        copper_price = self.default_material_type_price_copper
+        rubber_price = self.default_material_type_price_rubber
+        material_enabled = self.material_enabled
+        process_enabled = self.process_enabled
+        print_enabled = self.print_enabled
+        
+        columns = {
+            'material_unit_price': [],
+            'material_weight': [],
+            'process_unit_price': [],
+            'process_fee': [],
+            'print_unit_price': [],
+            'print_fee': [],
+            'bag_unit_price': [],
+            'total_fee': [],
+        }
+        material_unit_price_column = columns['material_unit_price']
+        material_weight_column = columns['material_weight']
+        process_unit_price_column = columns['process_unit_price']
+        process_fee_column = columns['process_fee']
+        print_unit_price_column = columns['print_unit_price']
+        print_fee_column = columns['print_fee']
+        bag_unit_price_column = columns['bag_unit_price']
+        total_fee_column = columns['total_fee']
+        
+        for index in range(size):
+            quantity = quantities[index]
+            try:
+                if material_enabled:
+                    material_unit_price, weight = engine.material(
+                        openings[index], widths[index], thicknesses[index],
+                        param_values[index], material_prices[index], quantity
+                    )
+                else:
+                    material_unit_price = weight = 0.0
+                
+                if process_enabled:
+                    process_unit_price, process_fee = engine.process(
+                        openings[index], quantity, process_params[index]
+                    )
+                else:
+                    process_unit_price = process_fee = 0.0
+                
+                if print_enabled:
+                    plate_price = copper_price if material_types[index] == "铜板" else rubber_price
+                    print_unit_price, print_fee = engine.printing(quantity, print_params[index], plate_price)
+                else:
+                    print_unit_price = print_fee = 0.0
+                
+                bag_unit_price = engine.bag_unit_price(material_unit_price, process_unit_price, print_unit_price)
+            except Exception as e:
+                raise Exception(f"第{index + 1}行计算过程中发生错误：{str(e)}")
+            
+            material_unit_price_column.append(material_unit_price)
+            material_weight_column.append(weight)
+            process_unit_price_column.append(process_unit_price)
+            process_fee_column.append(process_fee)
+            print_unit_price_column.append(print_unit_price)
+            print_fee_column.append(print_fee)
+            bag_unit_price_column.append(bag_unit_price)
+            total_fee_column.append(material_unit_price * quantity + process_fee + print_fee)
+        
+        return columns
+    
     def reset(self):
         self.material_unit_price = 0
         self.material_weight = 0
@@ -213,4 +1069,4 @@ class CalculatorLogic:
         self.print_fee = 0
         self.bag_unit_price = 0
         self.material_type_price = 0
-        self.detail_text = ""
+        self.last_quote = None
@@ -0,0 +1,194 @@
+"""运行耗时统计
+
+默认关闭。设置环境变量 UNITPRICE_INSTRUMENT=1 或调用 enable() 后，各处埋点把耗时记录到
+内存中的直方图，并逐条转发给已注册的输出（日志文件或回调函数）。关闭时埋点只多一次属性判断。
+UNITPRICE_INSTRUMENT_LOG 指定时，逐条耗时追加写入该文件。
+
+    UNITPRICE_INSTRUMENT=1 UNITPRICE_INSTRUMENT_LOG=timings.log python main.py
+"""
+import bisect
+import functools
+import os
+import threading
+import time
+
+ENV_ENABLED = "UNITPRICE_INSTRUMENT"
+ENV_LOG = "UNITPRICE_INSTRUMENT_LOG"
+
+# 埋点处先判断 enabled 再取时间，关闭时不调用任何函数
+enabled = False
+clock = time.perf_counter
+
+# 直方图各桶的上界（微秒），按 1-2-5 递增，最后一个桶收纳超过 10 秒的记录
+BUCKET_BOUNDS_US = tuple(
+    base * 10 ** exponent for exponent in range(0, 7) for base in (1, 2, 5)
+) + (10 ** 7,)
+
+
+class Histogram:
+    """按固定桶计数的耗时直方图，分位数取所在桶的上界（不超过最大值）"""
+    
+    __slots__ = ('counts', 'count', 'total', 'minimum', 'maximum')
+    
+    def __init__(self):
+        self.counts = [0] * (len(BUCKET_BOUNDS_US) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.minimum = None
+        self.maximum = None
+    
+    def add(self, seconds):
+        micros = seconds * 1e6
+        self.counts[bisect.bisect_left(BUCKET_BOUNDS_US, micros)] += 1
+        self.count += 1
+        self.total += micros
+        if self.minimum is None or micros < self.minimum:
+            self.minimum = micros
+        if self.maximum is None or micros > self.maximum:
+            self.maximum = micros
+    
+    def percentile(self, fraction):
+        """返回耗时分位数（微秒），没有记录时返回 0"""
+        if not self.count:
+            return 0.0
+        rank = max(1, fraction * self.count)
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                if index < len(BUCKET_BOUNDS_US):
+                    return min(float(BUCKET_BOUNDS_US[index]), self.maximum)
+                break
+        return self.maximum
+    
+    def summary(self):
+        return {
+            "count": self.count,
+            "mean_us": round(self.total / self.count, 1) if self.count else 0.0,
+            "min_us": round(self.minimum or 0.0, 1),
+            "p50_us": round(self.percentile(0.5), 1),
+            "p90_us": round(self.percentile(0.9), 1),
+            "p99_us": round(self.percentile(0.99), 1),
+            "max_us": round(self.maximum or 0.0, 1),
+        }
+
+
+class FileSink:
+    """把每条耗时追加写入文本文件：时间戳、名称、微秒，以制表符分隔"""
+    
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'a', encoding='utf-8', buffering=1)
+        self._lock = threading.Lock()
+    
+    def __call__(self, name, seconds):
+        line = f"{time.time():.3f}\t{name}\t{seconds * 1e6:.1f}\n"
+        with self._lock:
+            self._file.write(line)
+    
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+_histograms = {}
+_sinks = []
+_lock = threading.Lock()
+
+
+def enable(flag=True):
+    """打开或关闭统计；已记录的直方图保留到 reset()"""
+    global enabled
+    enabled = bool(flag)
+
+
+def disable():
+    enable(False)
+
+
+def add_sink(sink):
+    """注册输出：sink(name, seconds) 会在每条记录后被调用，可以是 FileSink 或任意回调"""
+    with _lock:
+        _sinks.append(sink)
+    return sink
+
+
+def remove_sink(sink):
+    with _lock:
+        if sink in _sinks:
+            _sinks.remove(sink)
+
+
+def record(name, seconds):
+    """记录一次耗时（秒），可在任意线程调用"""
+    with _lock:
+        histogram = _histograms.get(name)
+        if histogram is None:
+            histogram = _histograms[name] = Histogram()
+        histogram.add(seconds)
+        sinks = tuple(_sinks)
+    for sink in sinks:
+        try:
+            sink(name, seconds)
+        except Exception as e:
+            print(f"耗时统计输出失败: {e}")
+
+
+def timed(name):
+    """装饰器：统计打开时记录函数的耗时，关闭时直接调用原函数"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not enabled:
+                return func(*args, **kwargs)
+            started = clock()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                record(name, clock() - started)
+        return wrapper
+    return decorator
+
+
+def get_histogram(name):
+    with _lock:
+        return _histograms.get(name)
+
+
+def snapshot():
+    """返回 {名称: 汇总} 字典，按名称排序"""
+    with _lock:
+        return {name: _histograms[name].summary() for name in sorted(_histograms)}
+
+
+def reset():
+    with _lock:
+        _histograms.clear()
+
+
+def format_summary():
+    """把 snapshot() 排成便于阅读的文本表格"""
+    lines = ["名称\t次数\t平均\tp50\tp90\tp99\t最大（微秒）"]
+    for name, summary in snapshot().items():
+        lines.append("\t".join(str(value) for value in (
+            name, summary['count'], summary['mean_us'], summary['p50_us'],
+            summary['p90_us'], summary['p99_us'], summary['max_us'],
+        )))
+    return "\n".join(lines)
+
+
+def configure_from_env(environ=None):
+    """按环境变量打开统计并注册日志文件输出"""
+    environ = os.environ if environ is None else environ
+    if environ.get(ENV_ENABLED, "").strip().lower() in ("", "0", "false", "no", "off"):
+        return
+    enable()
+    log_path = environ.get(ENV_LOG)
+    if log_path:
+        try:
+            add_sink(FileSink(log_path))
+        except OSError as e:
+            print(f"无法打开耗时日志文件: {e}")
+
+
+configure_from_env()
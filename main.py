@@ -1,24 +1,30 @@
 import os
 import sys
+
+# 剖析参数要在导入 Kivy 之前取出，否则会被当作 Kivy 自己的命令行参数；
+# 剖析从这里开始，启动阶段（包括导入 Kivy）也会被记录。
+# profiling 会导入 cProfile、pstats 和 tracemalloc，只在剖析模式下才导入，不拖慢正常启动
+PROFILE_SESSION = None
+if os.environ.get("UNITPRICE_PROFILE") or any(arg.startswith("--profile") for arg in sys.argv[1:]):
+    from profiling import session_from_args
+    PROFILE_SESSION, sys.argv[1:] = session_from_args(sys.argv[1:])
+    if PROFILE_SESSION is not None:
+        PROFILE_SESSION.start()
+
 from kivy.app import App
-from kivy.uix.boxlayout import BoxLayout
-from kivy.uix.gridlayout import GridLayout
-from kivy.uix.scrollview import ScrollView
-from kivy.uix.label import Label
-from kivy.uix.textinput import TextInput
-from kivy.uix.button import Button
-from kivy.uix.checkbox import CheckBox
-from kivy.uix.spinner import Spinner
-from kivy.uix.popup import Popup
-from kivy.uix.togglebutton import ToggleButton
+from kivy.lang import Builder
 from kivy.uix.screenmanager import ScreenManager, Screen
-from kivy.properties import StringProperty, BooleanProperty, NumericProperty, ObjectProperty
+from kivy.properties import BooleanProperty, NumericProperty
 from kivy.clock import Clock
 from kivy.core.window import Window
 from kivy.metrics import dp
 
-from calculator_logic import CalculatorLogic
-from template_manager import TemplateManager
+import instrumentation
+from calculator_logic import CalculatorLogic, TemplateParams
+from template_manager import TemplateManager, TemplateWriter
+
+# kv 中用到的控件由 Factory 在首次使用时导入；其余界面的规则和模板对比、报价历史模块在第一次使用时才加载
+KV_DIR = os.path.dirname(os.path.abspath(__file__))
 
 class CalculatorScreen(Screen):
     pass
@@ -26,21 +32,66 @@ class CalculatorScreen(Screen):
 class TemplateManagerScreen(Screen):
     pass
 
+class TemplateCompareScreen(Screen):
+    pass
+
+class QuoteHistoryScreen(Screen):
+    pass
+
 class UnitPriceCalculatorApp(App):
+    # 输入变化后等待多久再重新计算（秒）；0 表示把同一帧内的变化合并为一次计算
+    recalc_debounce = NumericProperty(0)
+    # 耗时统计开关，默认取环境变量 UNITPRICE_INSTRUMENT，见 instrumentation.py
+    instrument = BooleanProperty(instrumentation.enabled)
+    # 剖析模式下在前后拍内存快照的方法
+    PROFILED_METHODS = (
+        'build', 'init_ui', 'apply_template', 'open_template_manager', 'open_template_compare', 'select_template',
+        'create_new_template', 'duplicate_template', 'delete_template', 'rename_template',
+        'set_as_default', 'save_template_settings', 'open_quote_history', 'recall_quote',
+    )
+    profile_session = None
+    # 输入停止变化多久后把当前报价记入历史（秒），避免把输入过程中的中间结果都记下来
+    HISTORY_DELAY = 2
+    
     def build(self):
+        # 本轮计算对应的第一次输入时间，统计从按键到结果显示的耗时
+        self._input_started = None
         Window.size = (dp(400), dp(700))
         self.title = "单价计算器 V4"
         
-        self.template_manager = TemplateManager()
+        # 模板修改合并后由后台线程写盘，平板的闪存上每次整文件重写都很慢，
+        # 所以只追加变更日志，日志变大后再在后台合并
+        self.template_manager = TemplateManager(write_behind=True, journal=True)
+        self.template_writer = TemplateWriter(
+            self.template_manager, delay=1.0, on_error=self._on_template_save_error
+        ).start()
         self.calculator = CalculatorLogic()
+        # 业务员常在少数几个规格和模板之间来回切换
+        self.calculator.enable_cache(256).bind_template_manager(self.template_manager)
         
         self.setup_default_values()
         
+        self._recalc_trigger = Clock.create_trigger(self._run_scheduled_calculation, self.recalc_debounce)
+        
+        # 报价历史在第一次记录或打开历史界面时才读取，见 get_quote_history
+        self.quote_history = None
+        self._history_opened = False
+        self._history_quote = None
+        self._history_entries = []
+        self._history_trigger = Clock.create_trigger(self._record_history, self.HISTORY_DELAY)
+        
+        self._template_row_index = {}
+        
+        Builder.load_file(os.path.join(KV_DIR, 'calculator.kv'))
         self.sm = ScreenManager()
         self.calculator_screen = CalculatorScreen(name='calculator')
-        self.template_screen = TemplateManagerScreen(name='template_manager')
+        self.template_screen = None
+        self.compare_screen = None
+        # 模板对比的结果和当前排序
+        self._compare_rows = []
+        self._compare_sort = ('bag_unit_price', False)
+        self.history_screen = None
         self.sm.add_widget(self.calculator_screen)
-        self.sm.add_widget(self.template_screen)
         
         Clock.schedule_once(self.init_ui, 0)
         
@@ -50,12 +101,27 @@ class UnitPriceCalculatorApp(App):
         last_used = self.template_manager.get_last_used_template()
         template_name = last_used or self.template_manager.get_default_template_name()
         
-        if template_name:
-            settings = self.template_manager.get_template_settings(template_name)
-        else:
-            settings = {}
-        
         self.current_template_name = template_name or ""
+        self.load_template_defaults(template_name)
+    
+    def load_template_defaults(self, template_name):
+        """读取模板：输入框显示原始文本，计算直接使用 TemplateManager 缓存的 TemplateParams"""
+        settings = self.template_manager.get_template_settings(template_name) if template_name else None
+        params = None
+        # 旧数据中的参数无法解析时，计算改为解析输入框中显示的文本，不再使用缓存的模板参数
+        self.template_params_error = None
+        if settings is not None:
+            try:
+                params = self.template_manager.get_template_params(template_name)
+            except ValueError as e:
+                print(f"模板参数无效: {e}")
+                self.template_params_error = f"模板 {template_name} 的参数无效：\n{e}"
+                params = TemplateParams.from_settings(settings, strict=False)
+        settings = settings or {}
+        if params is None:
+            params = TemplateParams.from_settings({})
+        
+        self.template_params = params
         self.default_param_value = settings.get('param_value', '0.95')
         self.default_material_price = settings.get('material_price', '9')
         self.default_process_param = settings.get('process_param', '0.2')
@@ -63,48 +129,37 @@ class UnitPriceCalculatorApp(App):
         self.default_material_type = settings.get('material_type', '铜板')
         self.default_material_type_price_copper = settings.get('material_type_price_copper', '100')
         self.default_material_type_price_rubber = settings.get('material_type_price_rubber', '50')
-        self.default_material_enabled = settings.get('material_enabled', True)
-        self.default_process_enabled = settings.get('process_enabled', True)
-        self.default_print_enabled = settings.get('print_enabled', True)
+        self.default_material_enabled = params.material_enabled
+        self.default_process_enabled = params.process_enabled
+        self.default_print_enabled = params.print_enabled
         
-        self.calculator.material_enabled = self.default_material_enabled
-        self.calculator.process_enabled = self.default_process_enabled
-        self.calculator.print_enabled = self.default_print_enabled
-        self.calculator.default_material_type_price_copper = float(self.default_material_type_price_copper)
-        self.calculator.default_material_type_price_rubber = float(self.default_material_type_price_rubber)
+        self.calculator.apply_params(params)
     
     def init_ui(self, dt):
+        load_error = self.template_manager.load_error
+        if load_error is not None:
+            # 原数据文件保留不动，只在内存中使用默认模板
+            self.show_error(f"模板数据文件无法读取，本次的修改不会保存：\n{load_error}")
         self.update_template_spinner()
         self.apply_template(self.current_template_name)
     
     def update_template_spinner(self):
-        template_names = self.template_manager.get_template_names()
+        template_names = self.template_manager.get_sorted_template_names()
         spinner = self.calculator_screen.ids.template_spinner
         spinner.values = template_names
-        if self.current_template_name in template_names:
+        if self.template_manager.has_template(self.current_template_name):
             spinner.text = self.current_template_name
     
     def apply_template(self, template_name):
         if not template_name:
             return
         
-        settings = self.template_manager.get_template_settings(template_name)
-        if settings is None:
+        if not self.template_manager.has_template(template_name):
             return
         
         self.current_template_name = template_name
         self.template_manager.set_last_used_template(template_name)
-        
-        self.default_param_value = settings.get('param_value', '0.95')
-        self.default_material_price = settings.get('material_price', '9')
-        self.default_process_param = settings.get('process_param', '0.2')
-        self.default_print_param = settings.get('print_param', '0.015')
-        self.default_material_type = settings.get('material_type', '铜板')
-        self.default_material_type_price_copper = settings.get('material_type_price_copper', '100')
-        self.default_material_type_price_rubber = settings.get('material_type_price_rubber', '50')
-        self.default_material_enabled = settings.get('material_enabled', True)
-        self.default_process_enabled = settings.get('process_enabled', True)
-        self.default_print_enabled = settings.get('print_enabled', True)
+        self.load_template_defaults(template_name)
         
         screen = self.calculator_screen
         screen.ids.param_value.text = self.default_param_value
@@ -117,9 +172,8 @@ class UnitPriceCalculatorApp(App):
         screen.ids.process_checkbox.active = self.default_process_enabled
         screen.ids.print_checkbox.active = self.default_print_enabled
         
-        self.calculator.material_enabled = self.default_material_enabled
-        self.calculator.process_enabled = self.default_process_enabled
-        self.calculator.print_enabled = self.default_print_enabled
+        if self.template_params_error:
+            self.show_error(self.template_params_error)
         
         self.calculate_all()
     
@@ -134,36 +188,61 @@ class UnitPriceCalculatorApp(App):
             material_price = self.default_material_type_price_rubber
         
         self.calculator.material_type = text
-        self.calculate_all()
+        self.schedule_calculation()
     
     def on_calculation_toggled(self, checkbox, value):
         self.calculator.material_enabled = self.calculator_screen.ids.material_checkbox.active
         self.calculator.process_enabled = self.calculator_screen.ids.process_checkbox.active
         self.calculator.print_enabled = self.calculator_screen.ids.print_checkbox.active
-        self.calculate_all()
+        self.schedule_calculation()
     
     def on_value_changed(self, instance, value):
+        if instrumentation.enabled and self._input_started is None:
+            self._input_started = instrumentation.clock()
+        self.schedule_calculation()
+    
+    def on_instrument(self, instance, value):
+        instrumentation.enable(value)
+    
+    def on_recalc_debounce(self, instance, value):
+        trigger = getattr(self, '_recalc_trigger', None)
+        if trigger is not None:
+            pending = trigger.is_triggered
+            trigger.cancel()
+            self._recalc_trigger = Clock.create_trigger(self._run_scheduled_calculation, value)
+            if pending:
+                self._recalc_trigger()
+    
+    def schedule_calculation(self):
+        """合并连续的输入变化：一帧（或防抖窗口）内多次调用只重新计算一次"""
+        self._recalc_trigger()
+    
+    def _run_scheduled_calculation(self, dt):
         self.calculate_all()
     
     def calculate_all(self):
+        # 立即计算时，之前排队的计算已经没有意义
+        self._recalc_trigger.cancel()
+        
         screen = self.calculator_screen
         
-        opening = screen.ids.opening.text
-        width = screen.ids.width.text
-        thickness = screen.ids.thickness.text
-        param_value = screen.ids.param_value.text or self.default_param_value
-        material_price = screen.ids.material_price.text or self.default_material_price
-        quantity = screen.ids.quantity.text
-        process_param = screen.ids.process_param.text or self.default_process_param
-        print_param = screen.ids.print_param.text or self.default_print_param
-        material_type = screen.ids.material_type.text
-        
-        self.calculator.set_values(
-            opening, width, thickness, param_value, material_price,
-            quantity, process_param, print_param, material_type
-        )
+        # 参数框为空或仍是模板原值时直接用已解析的模板参数，只有改动过的输入才需要解析；
+        # 模板参数无效时显示的文本与计算用的参数不一致，所以总是解析输入框
+        use_template = not self.template_params_error
+        
+        def edited(text, template_text):
+            return None if not text or (use_template and text == template_text) else text
         
         try:
+            self.calculator.set_params_values(
+                screen.ids.opening.text, screen.ids.width.text, screen.ids.thickness.text, screen.ids.quantity.text,
+                edited(screen.ids.param_value.text, self.default_param_value),
+                edited(screen.ids.material_price.text, self.default_material_price),
+                edited(screen.ids.process_param.text, self.default_process_param),
+                edited(screen.ids.print_param.text, self.default_print_param),
+                screen.ids.material_type.text,
+            )
+            
             result = self.calculator.calculate_all()
             
             screen.ids.bag_unit_price.text = f"{result['bag_unit_price']:.3f} 元"
@@ -175,8 +254,38 @@ class UnitPriceCalculatorApp(App):
             total_fee = result['material_unit_price'] * self.calculator.quantity + result['process_fee'] + result['print_fee']
             screen.ids.total_fee.text = f"{total_fee:.3f} 元"
             
+            # 每次计算都重新开始等待，输入停下来之后才记入历史
+            self._history_quote = result.quote
+            self._history_trigger.cancel()
+            self._history_trigger()
+            
         except Exception as e:
             pass
+        
+        started = self._input_started
+        if started is not None:
+            self._input_started = None
+            instrumentation.record("app.input_to_labels", instrumentation.clock() - started)
+    
+    def _record_history(self, dt):
+        quote = self._history_quote
+        self._history_quote = None
+        if quote is None or not (quote.inputs.quantity > 0 and quote.bag_unit_price > 0):
+            return
+        history = self.get_quote_history()
+        if history is not None:
+            history.add(quote, self.current_template_name)
+    
+    def get_quote_history(self):
+        """第一次使用时才导入并读取报价历史，不占用启动时间；历史文件无法识别时返回 None"""
+        if not self._history_opened:
+            self._history_opened = True
+            from quote_history import QuoteHistory
+            try:
+                self.quote_history = QuoteHistory()
+            except ValueError as e:
+                print(f"报价历史不可用: {e}")
+        return self.quote_history
     
     def reset_all_fields(self):
         template_name = self.current_template_name
@@ -195,42 +304,149 @@ class UnitPriceCalculatorApp(App):
         screen.ids.print_unit_price.text = "0.000 元"
         screen.ids.bag_unit_price.text = "0.000 元"
         screen.ids.total_fee.text = "0.000 元"
+        
+        # 清空输入触发的计算会覆盖上面的归零显示
+        self._recalc_trigger.cancel()
     
     def open_template_manager(self):
+        if self.template_screen is None:
+            Builder.load_file(os.path.join(KV_DIR, 'template_manager.kv'))
+            self.template_screen = TemplateManagerScreen(name='template_manager')
+            self.sm.add_widget(self.template_screen)
         self.sm.current = 'template_manager'
         self.refresh_template_list()
     
+    def open_template_compare(self):
+        if self.compare_screen is None:
+            Builder.load_file(os.path.join(KV_DIR, 'template_compare.kv'))
+            self.compare_screen = TemplateCompareScreen(name='template_compare')
+            self.sm.add_widget(self.compare_screen)
+        self.sm.current = 'template_compare'
+        self.refresh_template_compare()
+    
+    def refresh_template_compare(self):
+        """用计算器上的规格和个数对比筛选出的模板；只读取输入框，不修改界面参数，也不写数据文件"""
+        from template_compare import search_and_compare
+        
+        screen = self.compare_screen
+        if screen is None:
+            return
+        ids = self.calculator_screen.ids
+        spec = (ids.opening.text, ids.width.text, ids.thickness.text, ids.quantity.text)
+        screen.ids.compare_spec.text = f"{spec[0] or 0} * {spec[1] or 0}    {spec[2] or 0}C    {spec[3] or 0} 个"
+        try:
+            self._compare_rows = search_and_compare(
+                self.template_manager, *spec, text=screen.ids.compare_filter.text.strip(),
+                engine=self.calculator.engine,
+            )
+        except ValueError as e:
+            self._compare_rows = []
+            screen.ids.compare_spec.text = f"规格无效：{e}"
+        self.show_template_compare()
+    
+    def sort_template_compare(self, key):
+        """按列排序，再次点击同一列时反向"""
+        current_key, descending = self._compare_sort
+        self._compare_sort = (key, not descending if key == current_key else False)
+        self.show_template_compare()
+    
+    def show_template_compare(self):
+        from template_compare import sort_rows
+        
+        key, descending = self._compare_sort
+        rows = sort_rows(self._compare_rows, key, descending)
+        
+        def money(value):
+            return "" if value is None else f"{value:.3f}"
+        
+        self.compare_screen.ids.compare_list.data = [
+            {
+                'template_name': row.template_name,
+                'is_default': row.is_default,
+                'material_unit_price': money(row.material_unit_price),
+                'process_unit_price': money(row.process_unit_price),
+                'print_unit_price': money(row.print_unit_price),
+                'bag_unit_price': money(row.bag_unit_price),
+                'total_fee': money(row.total_fee),
+                'error': row.error or "",
+            }
+            for row in rows
+        ]
+    
+    def open_quote_history(self):
+        if self.history_screen is None:
+            Builder.load_file(os.path.join(KV_DIR, 'quote_history.kv'))
+            self.history_screen = QuoteHistoryScreen(name='quote_history')
+            self.sm.add_widget(self.history_screen)
+        # 还在等待的报价先记入，列表才包含刚算出的结果
+        if self._history_trigger.is_triggered:
+            self._history_trigger.cancel()
+            self._record_history(0)
+        self.sm.current = 'quote_history'
+        self.refresh_quote_history()
+    
+    def refresh_quote_history(self):
+        """列出内存中最近的报价，最新的在前"""
+        from datetime import datetime
+        
+        history = self.get_quote_history()
+        entries = history.recent() if history is not None else []
+        self._history_entries = entries
+        self.history_screen.ids.history_list.data = [
+            {
+                'index': index,
+                'time_text': datetime.fromtimestamp(entry.timestamp).strftime("%m-%d %H:%M"),
+                'template_name': entry.template_name,
+                'spec_text': f"{entry.opening:g} * {entry.width:g}    {entry.thickness:g}C    {entry.quantity:g} 个",
+                'bag_unit_price': f"{entry.bag_unit_price:.3f} 元",
+            }
+            for index, entry in enumerate(entries)
+        ]
+    
+    def recall_quote(self, index):
+        """把历史报价的模板、规格和个数填回计算器"""
+        entry = self._history_entries[index]
+        if entry.template_name and entry.template_name != self.current_template_name:
+            if self.template_manager.has_template(entry.template_name):
+                self.apply_template(entry.template_name)
+            else:
+                self.show_error(f"模板 '{entry.template_name}' 已不存在，使用当前模板计算")
+        
+        screen = self.calculator_screen
+        screen.ids.opening.text = f"{entry.opening:g}"
+        screen.ids.width.text = f"{entry.width:g}"
+        screen.ids.thickness.text = f"{entry.thickness:g}"
+        screen.ids.quantity.text = f"{entry.quantity:g}"
+        self.back_to_calculator()
+    
     def back_to_calculator(self):
         self.sm.current = 'calculator'
         self.update_template_spinner()
     
     def refresh_template_list(self):
+        """重建模板列表的数据；RecycleView 只为可见的行创建控件"""
         screen = self.template_screen
+        current_template = screen.ids.template_name.text
+        default_name = self.template_manager.get_default_template_name()
         template_names = self.template_manager.get_template_names()
         
-        layout = screen.ids.template_list_layout
-        layout.clear_widgets()
-        
-        current_template = screen.ids.template_name.text if screen.ids.template_name.text else ""
-        
-        for name in template_names:
-            template = self.template_manager.get_template(name)
-            is_default = template.get("is_default", False) if template else False
-            is_selected = (name == current_template)
-            
-            btn = Button(
-                text=f"{'⭐ ' if is_default else ''}{name}",
-                size_hint_y=None,
-                height=dp(40),
-                font_size=dp(13),
-                background_color=[0.9, 0.95, 1, 1] if is_selected else [1, 1, 1, 1],
-                color=[0, 0, 0, 1],
-                on_release=lambda btn, n=name: self.select_template(n)
-            )
-            layout.add_widget(btn)
+        self._template_row_index = {name: index for index, name in enumerate(template_names)}
+        screen.ids.template_list.data = [
+            {'template_name': name, 'is_default': name == default_name, 'selected': name == current_template}
+            for name in template_names
+        ]
+    
+    def update_template_row(self, name, **changes):
+        """就地修改一行的选中或默认标记，不重建整个列表"""
+        index = self._template_row_index.get(name)
+        if index is None:
+            return
+        data = self.template_screen.ids.template_list.data
+        data[index] = dict(data[index], **changes)
     
     def select_template(self, template_name):
         screen = self.template_screen
+        previous = screen.ids.template_name.text
         screen.ids.template_name.text = template_name
         
         template = self.template_manager.get_template(template_name)
@@ -248,7 +464,9 @@ class UnitPriceCalculatorApp(App):
             screen.ids.process_enabled.active = settings.get('process_enabled', True)
             screen.ids.print_enabled.active = settings.get('print_enabled', True)
         
-        self.refresh_template_list()
+        if previous != template_name:
+            self.update_template_row(previous, selected=False)
+            self.update_template_row(template_name, selected=True)
     
     def create_new_template(self):
         screen = self.template_screen
@@ -258,7 +476,7 @@ class UnitPriceCalculatorApp(App):
             self.show_error("请输入模板名称")
             return
         
-        if name in self.template_manager.get_template_names():
+        if self.template_manager.has_template(name):
             self.show_error(f"模板 '{name}' 已存在")
             return
         
@@ -289,7 +507,7 @@ class UnitPriceCalculatorApp(App):
             self.show_error("请输入新模板名称")
             return
         
-        if new_name in self.template_manager.get_template_names():
+        if self.template_manager.has_template(new_name):
             self.show_error(f"模板 '{new_name}' 已存在")
             return
         
@@ -363,9 +581,12 @@ class UnitPriceCalculatorApp(App):
             self.show_error("请先选择一个模板")
             return
         
+        previous_default = self.template_manager.get_default_template_name()
         success, msg = self.template_manager.set_default_template(template_name)
         if success:
-            self.refresh_template_list()
+            if previous_default != template_name:
+                self.update_template_row(previous_default, is_default=False)
+                self.update_template_row(template_name, is_default=True)
             self.show_info("已设为默认模板")
         else:
             self.show_error(msg)
@@ -414,6 +635,9 @@ class UnitPriceCalculatorApp(App):
         }
     
     def show_error(self, message):
+        from kivy.uix.label import Label
+        from kivy.uix.popup import Popup
+        
         popup = Popup(
             title='错误',
             content=Label(text=message),
@@ -422,6 +646,9 @@ class UnitPriceCalculatorApp(App):
         popup.open()
     
     def show_info(self, message):
+        from kivy.uix.label import Label
+        from kivy.uix.popup import Popup
+        
         popup = Popup(
             title='提示',
             content=Label(text=message),
@@ -429,10 +656,48 @@ class UnitPriceCalculatorApp(App):
         )
         popup.open()
     
+    def _on_template_save_error(self, message):
+        # 在后台写入线程中调用，弹窗需要回到主线程
+        Clock.schedule_once(lambda dt: self.show_error(message), 0)
+    
+    def on_start(self):
+        session = self.profile_session
+        if session is not None:
+            remaining = session.remaining()
+            if remaining is not None:
+                Clock.schedule_once(lambda dt: session.stop(), remaining)
+    
+    def on_pause(self):
+        # 切到后台后系统可能直接结束进程，先把未保存的模板修改和报价历史写入
+        self.template_manager.flush()
+        self.flush_quote_history()
+        return True
+    
+    def flush_quote_history(self):
+        if self._history_trigger.is_triggered:
+            self._history_trigger.cancel()
+            self._record_history(0)
+        if self.quote_history is not None:
+            self.quote_history.flush()
+    
     def on_stop(self):
         template_name = self.current_template_name
         if template_name:
             self.template_manager.set_last_used_template(template_name)
+        self.template_writer.stop()
+        self.flush_quote_history()
+        if instrumentation.enabled:
+            print(instrumentation.format_summary())
+        if self.profile_session is not None:
+            try:
+                path = self.profile_session.dump()
+                print(f"性能剖析结果已写入: {path}")
+            except Exception as e:
+                print(f"写入性能剖析结果失败: {e}")
 
 if __name__ == '__main__':
-    UnitPriceCalculatorApp().run()
+    app = UnitPriceCalculatorApp()
+    if PROFILE_SESSION is not None:
+        app.profile_session = PROFILE_SESSION
+        PROFILE_SESSION.wrap(app, app.PROFILED_METHODS)
+    app.run()
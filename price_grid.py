@@ -0,0 +1,177 @@
+"""报价矩阵生成
+
+按开口 × 宽度 × 厚度 × 个数的笛卡尔积计算单袋单价和总费用。各阶段只依赖部分维度：
+原料单价只与开口、宽度、厚度有关，加工只与开口、个数有关，印刷只与个数有关，
+所以每个阶段只按自己的维度计算一次，逐格只做整数相加。结果按块产出，不会把整个矩阵放进内存。
+
+    python price_grid.py --opening 20:60:5 --width 20,30,40 --thickness 3:8:0.5 \\
+        --quantity 1000,5000,10000 -o grid.csv
+"""
+import argparse
+import csv
+import sys
+import time
+from collections import namedtuple
+from decimal import Decimal
+
+from batch_quote import build_quote_input, load_template_settings
+from calculator_logic import ENGINE_FIXED, ENGINES, get_engine
+
+GridCell = namedtuple('GridCell', [
+    'opening', 'width', 'thickness', 'quantity', 'material_unit_price',
+    'process_unit_price', 'print_unit_price', 'bag_unit_price', 'total_fee',
+])
+
+# 阶段单价换算成千分位整数后直接相加；超出该范围时逐格交给引擎计算
+_EXACT_UNITS = 10 ** 15
+
+
+def value_range(start, stop, step):
+    """包含两端的等差数列，用 Decimal 累加避免浮点误差"""
+    start, stop, step = Decimal(str(start)), Decimal(str(stop)), Decimal(str(step))
+    if step <= 0:
+        raise ValueError("步长必须大于 0")
+    values = []
+    value = start
+    while value <= stop:
+        values.append(float(value))
+        value += step
+    return values
+
+
+def parse_dimension(text):
+    """解析命令行中的维度：'10,20,30' 为列表，'10:50:5' 为包含两端的范围"""
+    if ':' in text:
+        parts = text.split(':')
+        if len(parts) != 3:
+            raise ValueError(f"范围格式应为 起始:结束:步长，实际为 '{text}'")
+        return value_range(*parts)
+    return [float(part) for part in text.split(',') if part.strip()]
+
+
+def _to_units(value):
+    units = round(value * 1000)
+    if units / 1000 == value and abs(units) < _EXACT_UNITS:
+        return units
+    return None
+
+
+def iter_price_grid(base, openings, widths, thicknesses, quantities, engine=ENGINE_FIXED, chunk_size=10000):
+    """按块产出 GridCell 列表
+    
+    base 为 QuoteInput，提供参数值、原料价格、工费参数、版材类型、启用开关和版材价格，
+    其中的开口、宽度、厚度、个数会被各维度的取值替换。
+    """
+    engine = get_engine(engine)
+    openings = [float(value) for value in openings]
+    widths = [float(value) for value in widths]
+    thicknesses = [float(value) for value in thicknesses]
+    quantities = [float(value) for value in quantities]
+    
+    if base.print_enabled:
+        plate_price = base.plate_price
+        prints = [engine.printing(quantity, base.print_param, plate_price) for quantity in quantities]
+    else:
+        prints = [(0.0, 0.0)] * len(quantities)
+    print_units = [_to_units(unit_price) for unit_price, _ in prints]
+    
+    chunk = []
+    for opening in openings:
+        if base.process_enabled:
+            processes = [engine.process(opening, quantity, base.process_param) for quantity in quantities]
+        else:
+            processes = [(0.0, 0.0)] * len(quantities)
+        process_units = [_to_units(unit_price) for unit_price, _ in processes]
+        # 两个阶段合并后的千分位整数，None 表示这一格需要交给引擎
+        stage_units = [
+            None if process_unit is None or print_unit is None else process_unit + print_unit
+            for process_unit, print_unit in zip(process_units, print_units)
+        ]
+        
+        for width in widths:
+            for thickness in thicknesses:
+                if base.material_enabled:
+                    material_unit_price = engine.material(
+                        opening, width, thickness, base.param_value, base.material_price, 0.0
+                    )[0]
+                else:
+                    material_unit_price = 0.0
+                material_units = _to_units(material_unit_price)
+                
+                for index, quantity in enumerate(quantities):
+                    process_unit_price = processes[index][0]
+                    print_unit_price = prints[index][0]
+                    units = stage_units[index]
+                    if material_units is not None and units is not None and material_units + units:
+                        bag_unit_price = (material_units + units) / 1000
+                    else:
+                        bag_unit_price = engine.bag_unit_price(
+                            material_unit_price, process_unit_price, print_unit_price
+                        )
+                    
+                    chunk.append(GridCell(
+                        opening, width, thickness, quantity, material_unit_price,
+                        process_unit_price, print_unit_price, bag_unit_price,
+                        material_unit_price * quantity + processes[index][1] + prints[index][1],
+                    ))
+                    if len(chunk) >= chunk_size:
+                        yield chunk
+                        chunk = []
+    if chunk:
+        yield chunk
+
+
+def write_grid_csv(stream, chunks):
+    """把 iter_price_grid 的结果逐块写成 CSV，返回写出的行数"""
+    writer = csv.writer(stream)
+    writer.writerow(GridCell._fields)
+    count = 0
+    for chunk in chunks:
+        writer.writerows(
+            cell[:8] + (round(cell.total_fee, 3),) for cell in chunk
+        )
+        count += len(chunk)
+    return count
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="生成开口 × 宽度 × 厚度 × 个数的报价矩阵")
+    for name, label in (('opening', '开口'), ('width', '宽度'), ('thickness', '厚度'), ('quantity', '个数')):
+        parser.add_argument(f'--{name}', required=True, type=parse_dimension,
+                            help=f"{label}取值：逗号分隔的列表，或 起始:结束:步长")
+    parser.add_argument('-o', '--output', default='-', help="CSV 结果文件，默认写到标准输出")
+    parser.add_argument('-t', '--template', help="模板名称，默认使用默认模板")
+    parser.add_argument('--data-file', default="不能删除的数据文件.json", help="模板数据文件")
+    parser.add_argument('--engine', choices=sorted(ENGINES), default=ENGINE_FIXED, help="计算引擎")
+    parser.add_argument('--chunk-size', type=int, default=10000, help="每次写出的行数")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        settings = load_template_settings(args.data_file, args.template)
+    except ValueError as e:
+        print(f"加载模板失败: {e}", file=sys.stderr)
+        return 2
+    
+    base = build_quote_input({}, settings)
+    chunks = iter_price_grid(
+        base, args.opening, args.width, args.thickness, args.quantity, args.engine, args.chunk_size
+    )
+    
+    started = time.perf_counter()
+    stream = sys.stdout if args.output == '-' else open(args.output, 'w', encoding='utf-8', newline='')
+    try:
+        count = write_grid_csv(stream, chunks)
+    finally:
+        if stream is not sys.stdout:
+            stream.close()
+    
+    elapsed = time.perf_counter() - started
+    print(f"完成：{count} 格，用时 {elapsed:.2f} 秒", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,329 @@
+"""报价公式的解析求解
+
+加工费和印刷费都有最低收费：个数较少时按最低收费分摊到每个袋子，超过某个个数后
+才按单价计费。这些分界点可以直接由公式求出，不需要逐个个数试算。
+
+反过来，给定目标单价时也可以求出开口、宽度、厚度的最大值或个数的最小值：
+单价对这些变量单调，先由公式估算，再在估算点附近倍增、二分。
+"""
+import math
+from collections import namedtuple
+from decimal import Decimal
+from fractions import Fraction
+
+from calculator_logic import ENGINE_DECIMAL, get_engine, quote
+
+# 加工费最低收费（元）
+PROCESS_MINIMUM_FEE = 100
+
+QuantityBreakpoints = namedtuple('QuantityBreakpoints', [
+    'process', 'print', 'process_quantity', 'print_quantity',
+])
+QuantityBreakpoints.__doc__ = """最低收费不再生效的个数
+
+process / print 为精确分界点（Fraction），个数大于等于该值时按单价计费；
+process_quantity / print_quantity 为对应的最小整数个数。阶段未启用或始终
+按最低收费时为 None。
+"""
+
+PriceSegment = namedtuple('PriceSegment', [
+    'start', 'end', 'process_minimum', 'print_minimum',
+    'fixed_unit_price', 'minimum_fees', 'description',
+])
+PriceSegment.__doc__ = """单袋单价随个数变化的一段
+
+个数在 [start, end) 内（end 为 None 表示无上限）时，单袋单价 =
+fixed_unit_price + Σ 取整(最低收费 / 个数)，minimum_fees 列出这一段中按最低收费
+分摊的费用。
+"""
+
+LadderRow = namedtuple('LadderRow', [
+    'quantity', 'material_unit_price', 'process_unit_price', 'print_unit_price',
+    'bag_unit_price', 'total_fee', 'process_minimum', 'print_minimum',
+])
+
+
+def _fraction(value):
+    # 与 Decimal(str(value)) 取同一个十进制值
+    return Fraction(Decimal(str(value)))
+
+
+def _threshold(minimum_fee, rate):
+    if rate <= 0:
+        return None
+    return minimum_fee / rate
+
+
+def _ceil(value):
+    if value is None:
+        return None
+    return math.ceil(value)
+
+
+def quantity_breakpoints(inputs):
+    """求加工、印刷最低收费不再生效的个数，inputs 为 QuoteInput（其中的个数不参与计算）"""
+    process = None
+    if inputs.process_enabled:
+        rate = _fraction(inputs.opening) / 100 * _fraction(inputs.process_param)
+        process = _threshold(Fraction(PROCESS_MINIMUM_FEE), rate)
+    
+    print_ = None
+    if inputs.print_enabled:
+        print_ = _threshold(_fraction(inputs.plate_price), _fraction(inputs.print_param))
+    
+    return QuantityBreakpoints(process, print_, _ceil(process), _ceil(print_))
+
+
+def _format_quantity(value):
+    if value.denominator == 1:
+        return str(value.numerator)
+    return f"{float(value):.3f}"
+
+
+def price_curve(inputs, engine=ENGINE_DECIMAL):
+    """把单袋单价描述为个数的分段函数，返回按个数递增的 PriceSegment 列表
+    
+    只覆盖个数大于 0 的情况；个数为 0 时不分摊最低收费，单袋单价等于原料单价。
+    """
+    engine = get_engine(engine)
+    breakpoints = quantity_breakpoints(inputs)
+    
+    material_unit_price = 0.0
+    if inputs.material_enabled:
+        material_unit_price = engine.material(
+            inputs.opening, inputs.width, inputs.thickness,
+            inputs.param_value, inputs.material_price, 0.0
+        )[0]
+    
+    # 超过分界点后的单价与个数无关，取分界点处的整数个数让引擎按原公式计算
+    process_fixed = print_fixed = 0.0
+    if breakpoints.process_quantity is not None:
+        process_fixed = engine.process(
+            inputs.opening, float(breakpoints.process_quantity), inputs.process_param
+        )[0]
+    if breakpoints.print_quantity is not None:
+        print_fixed = engine.printing(
+            float(breakpoints.print_quantity), inputs.print_param, inputs.plate_price
+        )[0]
+    plate_price = engine.round_price(inputs.plate_price)
+    
+    cuts = sorted({point for point in (breakpoints.process, breakpoints.print) if point is not None})
+    bounds = [Fraction(0)] + cuts + [None]
+    
+    segments = []
+    for start, end in zip(bounds, bounds[1:]):
+        if end is not None and end <= start:
+            continue
+        process_minimum = inputs.process_enabled and (breakpoints.process is None or start < breakpoints.process)
+        print_minimum = inputs.print_enabled and (breakpoints.print is None or start < breakpoints.print)
+        
+        fixed_parts = [material_unit_price]
+        minimum_fees = []
+        terms = [f"{material_unit_price:.3f}"]
+        if process_minimum:
+            minimum_fees.append(float(PROCESS_MINIMUM_FEE))
+            terms.append(f"{PROCESS_MINIMUM_FEE:.3f}/个数")
+        elif inputs.process_enabled:
+            fixed_parts.append(process_fixed)
+            terms.append(f"{process_fixed:.3f}")
+        if print_minimum:
+            minimum_fees.append(plate_price)
+            terms.append(f"{plate_price:.3f}/个数")
+        elif inputs.print_enabled:
+            fixed_parts.append(print_fixed)
+            terms.append(f"{print_fixed:.3f}")
+        
+        fixed_unit_price = engine.bag_unit_price(*(fixed_parts + [0.0] * (3 - len(fixed_parts))))
+        if end is None:
+            span = f"个数 ≥ {_format_quantity(start)}" if start else "个数 > 0"
+        elif start:
+            span = f"{_format_quantity(start)} ≤ 个数 < {_format_quantity(end)}"
+        else:
+            span = f"0 < 个数 < {_format_quantity(end)}"
+        description = f"{span}：单袋单价 = {' + '.join(terms)}"
+        
+        segments.append(PriceSegment(
+            start, end, process_minimum, print_minimum,
+            fixed_unit_price, tuple(minimum_fees), description,
+        ))
+    return segments
+
+
+def price_ladder(inputs, quantities, engine=ENGINE_DECIMAL):
+    """一次计算多个个数档位的报价，返回 LadderRow 列表
+    
+    原料单价只计算一次，加工和印刷按档位计算，不生成计算算式。
+    结果与逐个 quote() 完全一致。
+    """
+    engine = get_engine(engine)
+    breakpoints = quantity_breakpoints(inputs)
+    
+    material_unit_price = 0.0
+    if inputs.material_enabled:
+        material_unit_price = engine.material(
+            inputs.opening, inputs.width, inputs.thickness,
+            inputs.param_value, inputs.material_price, 0.0
+        )[0]
+    plate_price = inputs.plate_price
+    
+    rows = []
+    for quantity in quantities:
+        quantity = float(quantity or 0)
+        if inputs.process_enabled:
+            process_unit_price, process_fee = engine.process(inputs.opening, quantity, inputs.process_param)
+        else:
+            process_unit_price = process_fee = 0.0
+        if inputs.print_enabled:
+            print_unit_price, print_fee = engine.printing(quantity, inputs.print_param, plate_price)
+        else:
+            print_unit_price = print_fee = 0.0
+        
+        exact_quantity = _fraction(quantity)
+        rows.append(LadderRow(
+            quantity, material_unit_price, process_unit_price, print_unit_price,
+            engine.bag_unit_price(material_unit_price, process_unit_price, print_unit_price),
+            material_unit_price * quantity + process_fee + print_fee,
+            inputs.process_enabled and (breakpoints.process is None or exact_quantity < breakpoints.process),
+            inputs.print_enabled and (breakpoints.print is None or exact_quantity < breakpoints.print),
+        ))
+    return rows
+
+
+# 反向求解时可以放开的变量，及其默认步长和上限
+SOLVE_VARIABLES = {
+    'opening': (Decimal('0.1'), Decimal('1000')),
+    'width': (Decimal('0.1'), Decimal('1000')),
+    'thickness': (Decimal('0.1'), Decimal('1000')),
+    'quantity': (Decimal('1'), Decimal('1000000000')),
+}
+
+
+class _TargetObjective:
+    """把某个变量离散为 步长 × n，按 n 计算单袋单价并缓存，供同一组输入的多个目标价共享"""
+    
+    def __init__(self, inputs, variable, engine, step, limit):
+        if variable not in SOLVE_VARIABLES:
+            raise ValueError(f"不支持的求解变量：{variable}")
+        default_step, default_limit = SOLVE_VARIABLES[variable]
+        self.inputs = inputs
+        self.variable = variable
+        self.engine = get_engine(engine)
+        self.step = Decimal(str(step)) if step is not None else default_step
+        if self.step <= 0:
+            raise ValueError("步长必须大于 0")
+        limit = Decimal(str(limit)) if limit is not None else default_limit
+        self.max_index = int(limit / self.step)
+        self._prices = {}
+        
+        self.material_coefficient = Fraction(0)
+        if inputs.material_enabled and variable != 'quantity':
+            factors = {
+                'opening': _fraction(inputs.opening) / 100,
+                'width': _fraction(inputs.width) / 100,
+                'thickness': _fraction(inputs.thickness) * 2 / 100,
+            }
+            factors[variable] = Fraction(1, 100) * (2 if variable == 'thickness' else 1)
+            self.material_coefficient = (
+                factors['opening'] * factors['width'] * factors['thickness']
+                * _fraction(inputs.param_value) * _fraction(inputs.material_price)
+            )
+    
+    def value(self, index):
+        return float(self.step * index)
+    
+    def price(self, index):
+        price = self._prices.get(index)
+        if price is None:
+            inputs = self.inputs._replace(**{self.variable: self.value(index)})
+            price = quote(inputs, self.engine, detail=False).bag_unit_price
+            self._prices[index] = price
+        return price
+    
+    def estimate(self, target):
+        """由公式直接估算边界所在的 n，只作为查找起点"""
+        step = Fraction(self.step)
+        if self.variable == 'quantity':
+            # 取第一段固定单价不超过目标价的分段，按 固定单价 + 最低收费 / 个数 = 目标价 反解个数
+            for segment in price_curve(self.inputs, self.engine):
+                fixed = _fraction(segment.fixed_unit_price)
+                if fixed > target:
+                    continue
+                if not segment.minimum_fees:
+                    return math.ceil(segment.start / step)
+                if fixed == target:
+                    return self.max_index
+                quantity = sum(map(_fraction, segment.minimum_fees)) / (target - fixed)
+                return math.ceil(max(quantity, segment.start) / step)
+            return self.max_index
+        
+        # 开口、宽度、厚度只影响原料单价（开口另外影响加工单价），其余单价取变量为 0 时的值
+        rest = _fraction(self.price(0))
+        if self.material_coefficient <= 0:
+            return self.max_index
+        return math.floor((target - rest) / self.material_coefficient / step)
+
+
+def _first_true(predicate, low, high, guess):
+    """predicate 在 [low, high] 上先假后真且 predicate(high) 为真，从估算点向两侧倍增再二分，返回第一个为真的 n"""
+    guess = min(max(guess, low), high)
+    span = 1
+    if predicate(guess):
+        high = guess
+        while guess - span >= low and predicate(guess - span):
+            high = guess - span
+            span *= 2
+        low = max(low, guess - span + 1)
+    else:
+        low = guess + 1
+        while guess + span < high and not predicate(guess + span):
+            low = guess + span + 1
+            span *= 2
+        high = min(high, guess + span)
+    
+    while low < high:
+        middle = (low + high) // 2
+        if predicate(middle):
+            high = middle
+        else:
+            low = middle + 1
+    return low
+
+
+def _solve(objective, target):
+    target_value = _fraction(target)
+    
+    def ok(index):
+        return _fraction(objective.price(index)) <= target_value
+    
+    if objective.max_index < 1:
+        return None
+    guess = objective.estimate(target_value)
+    
+    if objective.variable == 'quantity':
+        # 单袋单价随个数不增，求满足目标价的最小个数
+        if not ok(objective.max_index):
+            return None
+        return objective.value(_first_true(ok, 1, objective.max_index, guess))
+    
+    # 单袋单价随开口、宽度、厚度不减，求满足目标价的最大取值
+    if not ok(1):
+        return None
+    last = objective.max_index + 1
+    index = _first_true(lambda index: index == last or not ok(index), 2, last, guess + 1)
+    return objective.value(index - 1)
+
+
+def solve_for_target(inputs, variable, target, engine=ENGINE_DECIMAL, step=None, limit=None):
+    """求单袋单价不超过目标价时某个变量的边界值
+    
+    variable 为 opening / width / thickness 时返回满足目标价的最大取值，为 quantity 时返回最小个数；
+    取值按 step 离散（默认开口、宽度、厚度 0.1，个数 1），上限为 limit。目标价无法达到时返回 None。
+    各参数应为非负数，保证单价随变量单调。
+    """
+    return _solve(_TargetObjective(inputs, variable, engine, step, limit), target)
+
+
+def solve_for_targets(inputs, variable, targets, engine=ENGINE_DECIMAL, step=None, limit=None):
+    """批量求解多个目标价，返回与 targets 顺序一致的列表；各目标价共享已计算过的单价"""
+    objective = _TargetObjective(inputs, variable, engine, step, limit)
+    return [_solve(objective, target) for target in targets]
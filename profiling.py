@@ -0,0 +1,176 @@
+"""性能剖析模式
+
+从启动开始用 cProfile 记录调用耗时，记录窗口可以限定为启动后若干秒；同时在 build、init_ui
+和模板操作前后拍 tracemalloc 快照，记下每个区段内存增长最多的位置。退出时把按耗时排序的统计
+和内存分配位置写入文本文件，不需要连接调试器就能拿到设备上的实际数据。不依赖 Kivy。
+
+    python main.py --profile=profile.txt --profile-seconds=60
+    UNITPRICE_PROFILE=profile.txt UNITPRICE_PROFILE_SECONDS=60 python main.py
+"""
+import contextlib
+import cProfile
+import functools
+import io
+import os
+import pstats
+import time
+import tracemalloc
+
+ENV_PROFILE = "UNITPRICE_PROFILE"
+ENV_PROFILE_SECONDS = "UNITPRICE_PROFILE_SECONDS"
+DEFAULT_OUTPUT = "profile.txt"
+
+# 快照中忽略剖析工具自身和导入机制的分配
+_SNAPSHOT_FILTERS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, __file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+)
+
+
+class ProfileSession:
+    """一次剖析：start() 开始记录，stop() 结束记录窗口，dump() 写出报告
+    
+    session_seconds 为记录窗口的长度（秒），None 表示一直记录到 dump()。
+    cProfile 只记录调用 start() 的线程，stop() 也需要在该线程调用。
+    """
+    
+    def __init__(self, output=DEFAULT_OUTPUT, session_seconds=None, top=40, frames=5):
+        self.output = output
+        self.session_seconds = session_seconds
+        self.top = top
+        self.frames = frames
+        self.regions = []
+        self.started_at = None
+        self.active = False
+        self._profiler = cProfile.Profile()
+        self._owns_tracemalloc = False
+    
+    def start(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+            self._owns_tracemalloc = True
+        self.started_at = time.perf_counter()
+        self.active = True
+        self._profiler.enable()
+        return self
+    
+    def stop(self):
+        """结束记录窗口，已记录的数据保留到 dump()"""
+        if self.active:
+            self._profiler.disable()
+            self.active = False
+    
+    def remaining(self):
+        """记录窗口剩余的秒数；没有限定窗口时返回 None"""
+        if self.session_seconds is None or self.started_at is None:
+            return None
+        return max(0.0, self.session_seconds - (time.perf_counter() - self.started_at))
+    
+    def _snapshot(self):
+        return tracemalloc.take_snapshot().filter_traces(_SNAPSHOT_FILTERS)
+    
+    @contextlib.contextmanager
+    def region(self, name):
+        """记录区段前后的内存变化，只保留增长最多的 top 个位置"""
+        if not self.active or not tracemalloc.is_tracing():
+            yield
+            return
+        before = self._snapshot()
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            stats = self._snapshot().compare_to(before, 'lineno')
+            growth = sum(stat.size_diff for stat in stats)
+            self.regions.append((name, elapsed, growth, stats[:self.top]))
+    
+    def wrap(self, obj, names):
+        """把 obj 上的方法替换为在 region() 中执行的版本，替换只作用于这个实例"""
+        for name in names:
+            method = getattr(obj, name)
+            
+            def wrapper(*args, _method=method, _name=name, **kwargs):
+                with self.region(_name):
+                    return _method(*args, **kwargs)
+            
+            setattr(obj, name, functools.wraps(method)(wrapper))
+        return obj
+    
+    def report(self):
+        """生成报告文本：按累计耗时和自身耗时排序的调用统计、各区段和当前的内存分配位置"""
+        out = io.StringIO()
+        if self.started_at is not None:
+            out.write(f"记录时长: {time.perf_counter() - self.started_at:.1f} 秒\n")
+        
+        try:
+            stats = pstats.Stats(self._profiler, stream=out)
+        except TypeError:
+            out.write("\n没有记录到调用数据\n")
+        else:
+            stats.strip_dirs()
+            for sort_key, title in (('cumulative', "按累计耗时"), ('tottime', "按自身耗时")):
+                out.write(f"\n==== 调用统计（{title}，前 {self.top} 项） ====\n")
+                stats.sort_stats(sort_key).print_stats(self.top)
+        
+        for name, elapsed, growth, region_stats in self.regions:
+            out.write(f"\n==== 区段 {name}：{elapsed * 1000:.1f} 毫秒，内存变化 {growth / 1024:+.1f} KB ====\n")
+            for stat in region_stats:
+                out.write(f"{stat}\n")
+        
+        if tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            out.write(f"\n==== 内存分配位置（前 {self.top} 项） 当前 {current / 1024:.1f} KB，"
+                      f"峰值 {peak / 1024:.1f} KB ====\n")
+            for stat in self._snapshot().statistics('lineno')[:self.top]:
+                out.write(f"{stat}\n")
+        return out.getvalue()
+    
+    def dump(self, path=None):
+        """结束记录并把报告写入文件，返回文件路径"""
+        self.stop()
+        path = path or self.output
+        text = self.report()
+        if self._owns_tracemalloc:
+            tracemalloc.stop()
+            self._owns_tracemalloc = False
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        return path
+
+
+def session_from_args(argv, environ=None):
+    """从命令行参数和环境变量读取剖析设置
+    
+    支持 --profile、--profile=文件 和 --profile-seconds=秒数；命令行优先于环境变量。
+    返回 (ProfileSession 或 None, 去掉剖析参数后的其余参数)。
+    """
+    environ = os.environ if environ is None else environ
+    output = environ.get(ENV_PROFILE) or None
+    if output is not None and output.strip().lower() in ("0", "false", "no", "off"):
+        output = None
+    elif output is not None and output.strip().lower() in ("1", "true", "yes", "on"):
+        output = DEFAULT_OUTPUT
+    seconds = environ.get(ENV_PROFILE_SECONDS) or None
+    
+    remaining = []
+    for arg in argv:
+        if arg == "--profile":
+            output = output or DEFAULT_OUTPUT
+        elif arg.startswith("--profile="):
+            output = arg.split("=", 1)[1] or DEFAULT_OUTPUT
+        elif arg.startswith("--profile-seconds="):
+            seconds = arg.split("=", 1)[1]
+        else:
+            remaining.append(arg)
+    
+    if output is None:
+        return None, remaining
+    try:
+        session_seconds = float(seconds) if seconds else None
+    except ValueError:
+        print(f"剖析时长无效: {seconds}")
+        session_seconds = None
+    return ProfileSession(output, session_seconds), remaining
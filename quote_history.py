@@ -0,0 +1,311 @@
+"""报价历史
+
+最近的报价保存在固定容量的环形缓冲区中，界面可以立即取用；每条报价同时追加到磁盘上的
+二进制日志（定长记录，约 90 字节一条），按时间范围、规格、模板筛选和导出 CSV 时逐块读取日志，
+不会把整个历史读入内存。模板名称另存在名称表中，记录里只保存编号。写到一半中断留下的
+残缺记录在下次打开时截掉。
+    
+    python quote_history.py 报价历史.bin -o history.csv --start 2026-01-01 --end 2026-02-01
+"""
+import argparse
+import csv
+import json
+import os
+import struct
+import sys
+import time
+from collections import deque, namedtuple
+from datetime import datetime
+
+HistoryEntry = namedtuple('HistoryEntry', [
+    'timestamp', 'template_name', 'opening', 'width', 'thickness', 'quantity',
+    'material_unit_price', 'process_unit_price', 'print_unit_price', 'bag_unit_price', 'total_fee',
+])
+
+MAGIC = b"QHST"
+VERSION = 1
+HEADER = struct.Struct("<4sH")
+# 时间戳、模板编号、开口、宽度、厚度、个数、原料单价、加工单价、印刷单价、单袋单价、总费用
+RECORD = struct.Struct("<dI9d")
+DEFAULT_HISTORY_FILE = "报价历史.bin"
+
+CSV_HEADER = ('time',) + HistoryEntry._fields[1:]
+
+
+def _append(path, data):
+    """追加写入并 fsync；失败时截回写入前的长度，不在文件中留下半条记录"""
+    with open(path, 'ab') as f:
+        start = f.seek(0, os.SEEK_END)
+        try:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        except OSError:
+            try:
+                f.truncate(start)
+            except OSError:
+                pass
+            raise
+
+
+class QuoteHistory:
+    """报价历史：内存中保留最近 capacity 条，全部记录追加到 history_file
+    
+    history_file 不是报价历史文件或名称表无法读取时抛出 ValueError。新记录先放入待写列表，
+    满 flush_every 条或调用 flush() 时一次写入文件；写入一直失败时待写列表最多保留 max_pending 条，
+    更早的记录被丢弃并计入 dropped。内存占用只与 capacity、max_pending 和模板数量有关。
+    
+    read_only 为 True 时只读取文件，不截掉残缺的尾部，也不写入，适合导出和查询。
+    """
+    
+    def __init__(self, history_file=DEFAULT_HISTORY_FILE, capacity=200, flush_every=16, max_pending=1024,
+                 read_only=False):
+        if capacity <= 0:
+            raise ValueError("历史容量必须大于 0")
+        self.history_file = history_file
+        self.names_file = history_file + ".names"
+        self.capacity = capacity
+        self.flush_every = flush_every
+        self.max_pending = max(max_pending, flush_every)
+        self.read_only = read_only
+        self.dropped = 0
+        self.last_error = None
+        self._recent = deque(maxlen=capacity)
+        self._pending = []
+        self._names = []
+        self._name_ids = {}
+        self._new_names = []
+        self._last_key = None
+        self.load()
+    
+    def load(self):
+        """读取名称表，截掉残缺的尾部记录（只读时只忽略），并把日志末尾的记录装入环形缓冲区"""
+        self._recent.clear()
+        self._names = self._load_names()
+        self._name_ids = {name: index for index, name in enumerate(self._names)}
+        
+        if not os.path.exists(self.history_file):
+            return
+        try:
+            with open(self.history_file, 'rb' if self.read_only else 'r+b') as f:
+                if not self._check_header(f):
+                    # 文件头都没有写完，按空文件处理
+                    if not self.read_only:
+                        f.truncate(0)
+                    return
+                size = f.seek(0, os.SEEK_END)
+                count = (size - HEADER.size) // RECORD.size
+                end = HEADER.size + count * RECORD.size
+                if end != size and not self.read_only:
+                    f.truncate(end)
+                f.seek(HEADER.size + max(0, count - self.capacity) * RECORD.size)
+                self._recent.extend(self._decode(f.read(end - f.tell())))
+        except OSError as e:
+            if self.read_only:
+                raise ValueError(f"无法读取报价历史：{e}") from e
+            print(f"读取报价历史失败: {e}")
+            self.last_error = e
+    
+    def _load_names(self):
+        """读取名称表；写到一半的最后一行会被截掉，无法解析的完整行记为空名称以保持编号不变
+        
+        名称表存在但无法读取时抛出 ValueError：否则所有记录的模板名称都会丢失，新名称的编号也会错位。
+        """
+        if not os.path.exists(self.names_file):
+            return []
+        names = []
+        try:
+            with open(self.names_file, 'rb' if self.read_only else 'r+b') as f:
+                data = f.read()
+                lines = data.split(b"\n")
+                # 最后一个换行之后的内容：文件完整时为空，写到一半时是残缺的一行
+                torn = lines.pop()
+                for line in lines:
+                    try:
+                        name = json.loads(line)
+                    except ValueError:
+                        name = ""
+                    names.append(name if isinstance(name, str) else "")
+                if torn and not self.read_only:
+                    f.truncate(len(data) - len(torn))
+        except OSError as e:
+            raise ValueError(f"无法读取报价历史的模板名称表：{e}") from e
+        return names
+    
+    def _check_header(self, f):
+        header = f.read(HEADER.size)
+        if len(header) < HEADER.size:
+            return False
+        magic, version = HEADER.unpack(header)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"不是可识别的报价历史文件：{self.history_file}")
+        return True
+    
+    def _decode(self, data):
+        names = self._names
+        usable = len(data) - len(data) % RECORD.size
+        for record in RECORD.iter_unpack(memoryview(data)[:usable]):
+            template_id = record[1]
+            name = names[template_id] if template_id < len(names) else ""
+            yield HistoryEntry(record[0], name, *record[2:])
+    
+    def _template_id(self, name):
+        template_id = self._name_ids.get(name)
+        if template_id is None:
+            template_id = self._name_ids[name] = len(self._names)
+            self._names.append(name)
+            self._new_names.append(name)
+        return template_id
+    
+    def add(self, quote, template_name="", timestamp=None):
+        """记录一次报价（calculate_all 返回的 Quote）；与上一条的模板和输入完全相同时不重复记录"""
+        key = (template_name, quote.inputs)
+        if key == self._last_key:
+            return None
+        self._last_key = key
+        self._template_id(template_name or "")
+        inputs = quote.inputs
+        entry = HistoryEntry(
+            time.time() if timestamp is None else timestamp, template_name or "",
+            inputs.opening, inputs.width, inputs.thickness, inputs.quantity,
+            quote.material_unit_price, quote.process_unit_price, quote.print_unit_price,
+            quote.bag_unit_price, quote.total_fee,
+        )
+        self._recent.append(entry)
+        self._pending.append(entry)
+        if len(self._pending) >= self.flush_every:
+            self.flush()
+        overflow = len(self._pending) - self.max_pending
+        if overflow > 0:
+            del self._pending[:overflow]
+            self.dropped += overflow
+        return entry
+    
+    def recent(self, limit=None):
+        """最近的报价，最新的在前"""
+        entries = list(reversed(self._recent))
+        return entries if limit is None else entries[:limit]
+    
+    def flush(self):
+        """把待写记录追加到日志文件，返回是否写入成功；失败的记录留到下一次，只读时不写入"""
+        if not self._pending:
+            return True
+        if self.read_only:
+            return False
+        try:
+            if self._new_names:
+                text = "".join(json.dumps(name, ensure_ascii=False) + "\n" for name in self._new_names)
+                _append(self.names_file, text.encode('utf-8'))
+                self._new_names = []
+            
+            data = b"".join(
+                RECORD.pack(entry.timestamp, self._name_ids[entry.template_name], *entry[2:])
+                for entry in self._pending
+            )
+            if not os.path.exists(self.history_file) or os.path.getsize(self.history_file) == 0:
+                data = HEADER.pack(MAGIC, VERSION) + data
+            _append(self.history_file, data)
+        except Exception as e:
+            print(f"保存报价历史失败: {e}")
+            self.last_error = e
+            return False
+        self._pending = []
+        self.last_error = None
+        return True
+    
+    def iter_entries(self, start=None, end=None, template_name=None, opening=None, width=None,
+                     thickness=None, quantity=None, chunk_records=1024):
+        """按写入顺序逐条产出符合条件的记录，包括尚未写入文件的记录
+        
+        start / end 为时间戳或 datetime，包含 start、不包含 end；其余条件为 None 时不筛选，
+        规格按数值相等比较。文件每次只读入 chunk_records 条。
+        """
+        if isinstance(start, datetime):
+            start = start.timestamp()
+        if isinstance(end, datetime):
+            end = end.timestamp()
+        
+        def matches(entry):
+            return ((start is None or entry.timestamp >= start)
+                    and (end is None or entry.timestamp < end)
+                    and (template_name is None or entry.template_name == template_name)
+                    and (opening is None or entry.opening == opening)
+                    and (width is None or entry.width == width)
+                    and (thickness is None or entry.thickness == thickness)
+                    and (quantity is None or entry.quantity == quantity))
+        
+        # 只读到开始时的文件末尾，遍历期间写入的记录已经在 pending 中
+        pending = list(self._pending)
+        if os.path.exists(self.history_file):
+            with open(self.history_file, 'rb') as f:
+                remaining = f.seek(0, os.SEEK_END) - HEADER.size
+                f.seek(0)
+                if self._check_header(f):
+                    chunk_size = chunk_records * RECORD.size
+                    while remaining > 0:
+                        data = f.read(min(chunk_size, remaining))
+                        if not data:
+                            break
+                        remaining -= len(data)
+                        for entry in self._decode(data):
+                            if matches(entry):
+                                yield entry
+        for entry in pending:
+            if matches(entry):
+                yield entry
+    
+    def export_csv(self, stream, **filters):
+        """把符合条件的记录逐条写成 CSV，返回写出的行数；filters 同 iter_entries"""
+        writer = csv.writer(stream)
+        writer.writerow(CSV_HEADER)
+        count = 0
+        for entry in self.iter_entries(**filters):
+            writer.writerow(
+                (datetime.fromtimestamp(entry.timestamp).strftime("%Y-%m-%d %H:%M:%S"),) + entry[1:]
+            )
+            count += 1
+        return count
+
+
+def _parse_time(text):
+    return datetime.fromisoformat(text)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="按条件导出报价历史")
+    parser.add_argument('history_file', nargs='?', default=DEFAULT_HISTORY_FILE, help="报价历史文件")
+    parser.add_argument('-o', '--output', default='-', help="CSV 结果文件，默认写到标准输出")
+    parser.add_argument('--start', type=_parse_time, help="起始时间（包含），如 2026-01-01 或 2026-01-01T08:00")
+    parser.add_argument('--end', type=_parse_time, help="结束时间（不包含）")
+    parser.add_argument('-t', '--template', help="只导出该模板的报价")
+    for name, label in (('opening', '开口'), ('width', '宽度'), ('thickness', '厚度'), ('quantity', '个数')):
+        parser.add_argument(f'--{name}', type=float, help=f"只导出该{label}的报价")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if not os.path.exists(args.history_file):
+        print(f"报价历史文件不存在: {args.history_file}", file=sys.stderr)
+        return 2
+    try:
+        history = QuoteHistory(args.history_file, capacity=1, read_only=True)
+    except ValueError as e:
+        print(f"读取报价历史失败: {e}", file=sys.stderr)
+        return 2
+    
+    stream = sys.stdout if args.output == '-' else open(args.output, 'w', encoding='utf-8', newline='')
+    try:
+        count = history.export_csv(
+            stream, start=args.start, end=args.end, template_name=args.template,
+            opening=args.opening, width=args.width, thickness=args.thickness, quantity=args.quantity,
+        )
+    finally:
+        if stream is not sys.stdout:
+            stream.close()
+    print(f"完成：{count} 条", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
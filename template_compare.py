@@ -0,0 +1,130 @@
+"""同一规格在各模板下的报价对比
+
+按开口、宽度、厚度、个数，用每个模板解析好的 TemplateParams 计算报价，不修改界面输入，
+也不写数据文件。各阶段只依赖部分参数（原料：参数值和原料价格；加工：工费参数；印刷：工费参数和
+版材价格），所以先按阶段把所有模板的参数去重，每组不同的参数只交给引擎计算一次，再逐个模板组合。
+结果与对每个模板调用 quote() 一致。
+"""
+from collections import namedtuple
+
+from calculator_logic import ENGINE_DECIMAL, get_engine
+
+CompareRow = namedtuple('CompareRow', [
+    'template_name', 'is_default', 'material_unit_price', 'material_weight',
+    'process_unit_price', 'process_fee', 'print_unit_price', 'print_fee',
+    'bag_unit_price', 'total_fee', 'error',
+])
+
+# 可以用来排序的列
+SORT_KEYS = (
+    'template_name', 'material_unit_price', 'material_weight', 'process_unit_price',
+    'process_fee', 'print_unit_price', 'print_fee', 'bag_unit_price', 'total_fee',
+)
+
+
+def _stage_results(keys, compute):
+    """对去重后的参数逐个计算，计算失败的记为异常"""
+    results = {}
+    for key in keys:
+        if key in results:
+            continue
+        try:
+            results[key] = compute(*key)
+        except Exception as e:
+            results[key] = e
+    return results
+
+
+def compare_templates(template_manager, opening, width, thickness, quantity,
+                      names=None, engine=ENGINE_DECIMAL):
+    """计算同一规格在多个模板下的报价，返回 CompareRow 列表，顺序与 names 相同
+    
+    names 为 None 时对比全部模板（按名称排序）；不存在的模板会被跳过。
+    模板参数无法解析或计算出错的行，数值列为 None，error 列注明原因。
+    """
+    engine = get_engine(engine)
+    opening = float(opening or 0)
+    width = float(width or 0)
+    thickness = float(thickness or 0)
+    quantity = float(quantity or 0)
+    if names is None:
+        names = template_manager.get_sorted_template_names()
+    default_name = template_manager.get_default_template_name()
+    
+    entries = []
+    for name in names:
+        try:
+            params = template_manager.get_template_params(name)
+        except ValueError as e:
+            entries.append((name, None, str(e)))
+            continue
+        if params is not None:
+            entries.append((name, params, None))
+    compiled = [params for _, params, _ in entries if params is not None]
+    
+    def material(param_value, material_price):
+        unit_price, weight = engine.material(opening, width, thickness, param_value, material_price, quantity)
+        return unit_price, engine.round_price(weight)
+    
+    def process(process_param):
+        return engine.process(opening, quantity, process_param)
+    
+    def printing(print_param, plate_price):
+        return engine.printing(quantity, print_param, plate_price)
+    
+    materials = _stage_results(
+        ((params.param_value, params.material_price) for params in compiled if params.material_enabled), material)
+    processes = _stage_results(
+        ((params.process_param,) for params in compiled if params.process_enabled), process)
+    prints = _stage_results(
+        ((params.print_param, params.plate_price) for params in compiled if params.print_enabled), printing)
+    
+    rows = []
+    for name, params, error in entries:
+        is_default = name == default_name
+        if params is None:
+            rows.append(CompareRow(name, is_default, None, None, None, None, None, None, None, None, error))
+            continue
+        
+        stages = (
+            materials[(params.param_value, params.material_price)] if params.material_enabled else (0.0, 0.0),
+            processes[(params.process_param,)] if params.process_enabled else (0.0, 0.0),
+            prints[(params.print_param, params.plate_price)] if params.print_enabled else (0.0, 0.0),
+        )
+        failed = next((stage for stage in stages if isinstance(stage, Exception)), None)
+        if failed is not None:
+            rows.append(CompareRow(name, is_default, None, None, None, None, None, None, None, None,
+                                   f"计算过程中发生错误：{failed}"))
+            continue
+        
+        (material_unit_price, material_weight), (process_unit_price, process_fee), \
+            (print_unit_price, print_fee) = stages
+        bag_unit_price = engine.bag_unit_price(material_unit_price, process_unit_price, print_unit_price)
+        rows.append(CompareRow(
+            name, is_default, material_unit_price, material_weight, process_unit_price, process_fee,
+            print_unit_price, print_fee, bag_unit_price,
+            material_unit_price * quantity + process_fee + print_fee, None,
+        ))
+    return rows
+
+
+def search_and_compare(template_manager, opening, width, thickness, quantity, text="",
+                       engine=ENGINE_DECIMAL):
+    """只对比名称中包含 text 的模板；text 为空时对比全部模板"""
+    names = template_manager.search_templates(text) if text else None
+    return compare_templates(template_manager, opening, width, thickness, quantity, names, engine)
+
+
+def sort_rows(rows, key='bag_unit_price', descending=False):
+    """按列排序，出错的行总是排在最后；相同值按模板名称排序"""
+    if key not in SORT_KEYS:
+        raise ValueError(f"不支持按 {key} 排序")
+    valid = [row for row in rows if row.error is None]
+    failed = [row for row in rows if row.error is not None]
+    valid.sort(key=lambda row: row.template_name)
+    if key != 'template_name':
+        valid.sort(key=lambda row: getattr(row, key), reverse=descending)
+    elif descending:
+        valid.reverse()
+    failed.sort(key=lambda row: row.template_name)
+    return valid + failed
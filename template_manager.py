@@ -1,50 +1,398 @@
+import bisect
 import json
 import os
+import queue
+import stat
+import tempfile
+import threading
 from datetime import datetime
 
-class TemplateManager:
-    def __init__(self, data_file="不能删除的数据文件.json"):
+import instrumentation
+from calculator_logic import TemplateParams
+
+DEFAULT_SETTINGS = {
+    "param_value": "0.95",
+    "material_price": "9",
+    "process_param": "0.2",
+    "print_param": "0.015",
+    "material_type": "铜板",
+    "material_type_price_copper": "100",
+    "material_type_price_rubber": "50",
+    "material_enabled": True,
+    "process_enabled": True,
+    "print_enabled": True
+}
+
+def _fsync_directory(directory):
+    """fsync 目录，让替换后的目录项也落盘；不支持打开目录的平台（Windows）上跳过"""
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def _write_atomic(path, text):
+    """先写同目录下的临时文件并 fsync，再原子替换目标文件并 fsync 所在目录
+    
+    临时文件名由 mkstemp 生成，不会与上次中断留下的或其他写入者的临时文件冲突；
+    写入失败时删除临时文件，目标文件保持原样。
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_file = tempfile.mkstemp(dir=directory, prefix=os.path.basename(path) + ".", suffix=".tmp")
+    try:
+        with open(fd, 'w', encoding='utf-8') as f:
+            # mkstemp 创建的文件只有属主可读写，沿用原文件的权限
+            try:
+                mode = stat.S_IMODE(os.stat(path).st_mode)
+            except OSError:
+                mode = 0o644
+            os.chmod(temp_file, mode)
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_file, path)
+    except BaseException:
+        try:
+            os.remove(temp_file)
+        except OSError:
+            pass
+        raise
+    _fsync_directory(directory)
+
+
+class BaseTemplateManager:
+    """模板存储的公共部分：变更回调和解析后的模板参数缓存
+    
+    子类负责存储，实现 load / save / flush 和模板的查询、修改方法（get_template_settings、
+    create_template 等）；界面和命令行工具只使用这些方法，不依赖具体的存储方式。
+    """
+    
+    def __init__(self, data_file, read_only=False):
         self.data_file = data_file
+        self.read_only = read_only
+        self._listeners = []
+        # 解析后的模板参数，模板变更时由第一个回调失效
+        self._params_cache = {}
+        self.add_listener(self._invalidate_params)
+        self.write_behind = False
+        self.on_dirty = None
+        self.dirty = False
+        self.last_error = None
+        self.load_error = None
+        self._lock = threading.RLock()
+    
+    def _invalidate_params(self, event, name):
+        self._params_cache.pop(name, None)
+    
+    def get_template_params(self, name):
+        """获取指定模板解析后的 TemplateParams，结果会缓存到模板被修改为止
+        
+        模板不存在时返回 None；旧数据中的设置无法解析时抛出 ValueError。
+        """
+        params = self._params_cache.get(name)
+        if params is None:
+            settings = self.get_template_settings(name)
+            if settings is None:
+                return None
+            params = TemplateParams.from_settings(settings)
+            self._params_cache[name] = params
+        return params
+    
+    def add_listener(self, callback):
+        """注册模板变更回调，callback(event, name)，event 为 create/update/delete/rename/set_default"""
+        self._listeners.append(callback)
+    
+    def remove_listener(self, callback):
+        """取消注册模板变更回调"""
+        if callback in self._listeners:
+            self._listeners.remove(callback)
+    
+    def _notify(self, event, name):
+        for callback in list(self._listeners):
+            try:
+                callback(event, name)
+            except Exception as e:
+                print(f"模板变更回调失败: {e}")
+
+
+class TemplateManager(BaseTemplateManager):
+    def __init__(self, data_file="不能删除的数据文件.json", write_behind=False, on_dirty=None,
+                 journal=False, journal_limit=256 * 1024, read_only=False):
+        """write_behind 为 True 时 save() 只标记有未保存的修改，由 flush() 统一写入；
+        on_dirty 在数据从已保存变为有修改时调用一次，可用来安排稍后的 flush()。
+        
+        journal 为 True 时每次修改只向 data_file.journal 追加一条记录，不重写整个数据文件；
+        日志超过 journal_limit 字节后在后台线程中合并为新的数据文件。
+        
+        read_only 为 True 时从不写文件（修改只保留在内存中），数据文件无法解析时抛出 ValueError，
+        不会用默认模板覆盖；适合命令行工具读取应用正在使用的数据文件。
+        
+        非只读时数据文件或日志存在但无法加载，也不会用默认模板覆盖：改为只在内存中使用默认模板，
+        load_error 记录原因，之后的修改不写文件，原文件留给用户恢复。
+        """
+        super().__init__(data_file, read_only)
+        self.journal = journal and not read_only
+        self.journal_file = f"{data_file}.journal"
+        self.journal_limit = journal_limit
         self.data = {
             "templates": {},
             "last_used_template": None
         }
+        self.write_behind = write_behind
+        self.on_dirty = on_dirty
+        # _lock 保护 data 的修改和序列化；_write_lock 保证快照按顺序写入文件
+        self._write_lock = threading.Lock()
+        # 索引：默认模板名称、按名称排序的列表、按插入顺序的名称列表（修改后重建）
+        self._default_name = None
+        self._sorted_names = []
+        self._names = None
+        # 日志状态：数据文件对应的日志代数、待写入的记录、日志文件头中的代数
+        self._generation = 0
+        self._pending_records = []
+        self._journal_generation_on_disk = None
+        self._replaying = False
+        self._compacting = False
         self.load()
     
+    @instrumentation.timed("template.load")
     def load(self):
         """从文件加载模板数据"""
         try:
             if os.path.exists(self.data_file):
                 with open(self.data_file, 'r', encoding='utf-8') as f:
                     self.data = json.load(f)
+                self._generation = self.data.get("journal_generation", 0)
+                self._rebuild_indexes()
+                self._replay_journal()
+            elif os.path.exists(self.journal_file):
+                raise FileNotFoundError(f"缺少数据文件，只有日志 {self.journal_file}")
             else:
                 self._init_default_templates()
         except Exception as e:
+            if self.read_only:
+                raise ValueError(f"模板数据文件无法读取：{self.data_file}：{e}") from e
             print(f"加载模板数据失败: {e}")
+            if os.path.exists(self.data_file) or os.path.exists(self.journal_file):
+                self.load_error = e
+                self.read_only = True
+                self.journal = False
             self._init_default_templates()
     
+    def _replay_journal(self):
+        """在数据文件上重放同一代的日志记录
+        
+        崩溃时写了一半的尾部记录会被跳过；日志模式下还会把它从文件中截掉，
+        否则下一次追加的记录会接在这半行后面，重新加载时一起被丢弃。
+        无法解析或字段不对的记录逐条跳过，不影响其余记录。
+        不使用日志时只在内存中重放，不写任何文件，留到下一次保存时合并进数据文件。
+        """
+        if not os.path.exists(self.journal_file):
+            return
+        
+        with open(self.journal_file, 'rb') as f:
+            header = f.readline()
+            try:
+                generation = json.loads(header).get("generation")
+            except (ValueError, AttributeError):
+                return
+            # 日志代数与数据文件不一致时，日志内容已经合并进数据文件
+            if generation != self._generation:
+                return
+            self._journal_generation_on_disk = generation
+            
+            complete_end = f.tell()
+            self._replaying = True
+            try:
+                for line_number, line in enumerate(iter(f.readline, b""), 2):
+                    if not line.endswith(b"\n"):
+                        break
+                    complete_end = f.tell()
+                    try:
+                        record = json.loads(line)
+                        if not isinstance(record, dict):
+                            raise ValueError("记录不是对象")
+                        self._apply_record(record)
+                    except (KeyError, TypeError, ValueError, AttributeError) as e:
+                        print(f"跳过无效的模板日志记录（第 {line_number} 行）: {e!r}")
+            finally:
+                self._replaying = False
+            torn = f.seek(0, os.SEEK_END) > complete_end
+        
+        if torn and self.journal:
+            with open(self.journal_file, 'r+b') as f:
+                f.truncate(complete_end)
+                f.flush()
+                os.fsync(f.fileno())
+    
+    def _apply_record(self, record):
+        op = record.get("op")
+        if op == "create":
+            self.create_template(record["name"], record["settings"], record.get("is_default", False))
+        elif op == "update":
+            self.update_template(record["name"], record["settings"])
+        elif op == "delete":
+            self.delete_template(record["name"])
+        elif op == "rename":
+            self.rename_template(record["old_name"], record["new_name"])
+        elif op == "set_default":
+            self.set_default_template(record["name"])
+        elif op == "last_used":
+            self.set_last_used_template(record["name"])
+    
+    def _journal_record(self, op, **fields):
+        """日志模式下记录一次修改，调用时持有 _lock"""
+        if self.journal and not self._replaying:
+            fields["op"] = op
+            self._pending_records.append(fields)
+    
     def save(self):
-        """保存模板数据到文件"""
-        try:
-            with open(self.data_file, 'w', encoding='utf-8') as f:
-                json.dump(self.data, f, ensure_ascii=False, indent=2)
-        except Exception as e:
-            print(f"保存模板数据失败: {e}")
+        """保存模板数据到文件；延迟写入模式下只标记修改，等待 flush()"""
+        if self._replaying or self.read_only:
+            return
+        if not self.write_behind:
+            self.dirty = True
+            self.flush()
+            return
+        
+        with self._lock:
+            was_dirty = self.dirty
+            self.dirty = True
+        # 上次写入失败时修改仍标记为未保存，需要重新安排
+        if (not was_dirty or self.last_error is not None) and self.on_dirty is not None:
+            self.on_dirty()
+    
+    @instrumentation.timed("template.flush")
+    def flush(self):
+        """把未保存的修改写入文件，返回是否写入成功，可在任意线程调用
+        
+        先写同目录下的临时文件并 fsync，再原子替换数据文件，写到一半崩溃也不会损坏原文件。
+        写文件期间发生的修改会重新标记，留给下一次 flush()。日志模式下只追加日志记录。
+        """
+        if self.journal:
+            return self._flush_journal()
+        
+        with self._write_lock:
+            with self._lock:
+                if not self.dirty:
+                    return True
+                if self._journal_generation_on_disk == self._generation:
+                    # 加载时重放过日志，新的数据文件已经包含这些记录，换一代让旧日志失效
+                    self._generation += 1
+                    self.data["journal_generation"] = self._generation
+                try:
+                    text = json.dumps(self.data, ensure_ascii=False, indent=2)
+                except Exception as e:
+                    print(f"保存模板数据失败: {e}")
+                    self.last_error = e
+                    return False
+                self.dirty = False
+            
+            try:
+                _write_atomic(self.data_file, text)
+            except Exception as e:
+                print(f"保存模板数据失败: {e}")
+                self.last_error = e
+                with self._lock:
+                    self.dirty = True
+                return False
+        self.last_error = None
+        return True
+    
+    def _flush_journal(self):
+        with self._write_lock:
+            with self._lock:
+                if not self.dirty:
+                    return True
+                records = self._pending_records
+                self._pending_records = []
+                generation = self._generation
+                self.dirty = False
+            
+            try:
+                text = "".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records)
+                if self._journal_generation_on_disk != generation:
+                    _write_atomic(self.journal_file, json.dumps({"generation": generation}) + "\n")
+                    self._journal_generation_on_disk = generation
+                with open(self.journal_file, 'a', encoding='utf-8') as f:
+                    f.write(text)
+                    f.flush()
+                    os.fsync(f.fileno())
+                    size = f.tell()
+            except Exception as e:
+                print(f"保存模板数据失败: {e}")
+                self.last_error = e
+                with self._lock:
+                    self._pending_records[:0] = records
+                    self.dirty = True
+                return False
+        self.last_error = None
+        
+        if size >= self.journal_limit:
+            self.start_compaction()
+        return True
+    
+    @instrumentation.timed("template.compact")
+    def compact(self):
+        """把当前数据写成新的数据文件并清空日志，返回是否成功
+        
+        数据文件带有日志代数；替换数据文件后旧日志的代数不再匹配，即使清空日志前崩溃也不会被重放。
+        """
+        if self.read_only:
+            return False
+        with self._write_lock:
+            with self._lock:
+                generation = self._generation + 1
+                text = json.dumps(dict(self.data, journal_generation=generation), ensure_ascii=False, indent=2)
+                records = self._pending_records
+                self._pending_records = []
+                was_dirty = self.dirty
+                self.dirty = False
+            
+            try:
+                _write_atomic(self.data_file, text)
+            except Exception as e:
+                print(f"合并模板日志失败: {e}")
+                self.last_error = e
+                with self._lock:
+                    self._pending_records[:0] = records
+                    self.dirty = self.dirty or was_dirty
+                return False
+            
+            with self._lock:
+                self._generation = generation
+                self.data["journal_generation"] = generation
+            try:
+                _write_atomic(self.journal_file, json.dumps({"generation": generation}) + "\n")
+                self._journal_generation_on_disk = generation
+            except Exception as e:
+                # 下次追加记录前会重新写日志文件头
+                print(f"清空模板日志失败: {e}")
+        return True
+    
+    def start_compaction(self):
+        """在后台线程中执行 compact()，已有合并在进行时直接返回"""
+        with self._lock:
+            if self._compacting:
+                return
+            self._compacting = True
+        
+        def run():
+            try:
+                self.compact()
+            finally:
+                self._compacting = False
+        
+        threading.Thread(target=run, name="TemplateCompaction", daemon=True).start()
     
     def _init_default_templates(self):
         """初始化默认模板"""
-        default_settings = {
-            "param_value": "0.95",
-            "material_price": "9",
-            "process_param": "0.2",
-            "print_param": "0.015",
-            "material_type": "铜板",
-            "material_type_price_copper": "100",
-            "material_type_price_rubber": "50",
-            "material_enabled": True,
-            "process_enabled": True,
-            "print_enabled": True
-        }
+        default_settings = DEFAULT_SETTINGS
         
         self.data = {
             "templates": {
@@ -56,11 +404,75 @@ class TemplateManager:
             },
             "last_used_template": "默认模板"
         }
-        self.save()
+        self._rebuild_indexes()
+        if self.journal:
+            self.compact()
+        else:
+            self.save()
+    
+    def _rebuild_indexes(self):
+        """按 data 重建索引；旧数据中有多个默认模板时只保留第一个"""
+        with self._lock:
+            self._default_name = None
+            for name, template in self.data["templates"].items():
+                if template.get("is_default", False):
+                    if self._default_name is None:
+                        self._default_name = name
+                    else:
+                        template["is_default"] = False
+            self._sorted_names = sorted(self.data["templates"])
+            self._names = None
+            self._params_cache.clear()
+    
+    def _index_add(self, name):
+        bisect.insort(self._sorted_names, name)
+        self._names = None
+    
+    def _index_remove(self, name):
+        index = bisect.bisect_left(self._sorted_names, name)
+        if index < len(self._sorted_names) and self._sorted_names[index] == name:
+            del self._sorted_names[index]
+        self._names = None
     
     def get_template_names(self):
-        """获取所有模板名称列表"""
-        return list(self.data["templates"].keys())
+        """获取所有模板名称列表（按创建顺序），返回的列表在模板变更前共享，不要修改"""
+        names = self._names
+        if names is None:
+            with self._lock:
+                names = self._names = list(self.data["templates"].keys())
+        return names
+    
+    def get_sorted_template_names(self):
+        """获取按名称排序的模板名称列表，返回的列表与索引共享，不要修改"""
+        return self._sorted_names
+    
+    def has_template(self, name):
+        """模板是否存在"""
+        return name in self.data["templates"]
+    
+    def find_templates(self, prefix, limit=None):
+        """按名称前缀查找模板，结果按名称排序"""
+        names = self._sorted_names
+        index = bisect.bisect_left(names, prefix)
+        result = []
+        while index < len(names) and names[index].startswith(prefix):
+            if limit is not None and len(result) >= limit:
+                break
+            result.append(names[index])
+            index += 1
+        return result
+    
+    def search_templates(self, text, limit=None):
+        """查找名称中包含 text 的模板，前缀匹配的排在前面，其余按名称排序"""
+        result = self.find_templates(text, limit)
+        if limit is not None and len(result) >= limit:
+            return result
+        for name in self._sorted_names:
+            if text in name and not name.startswith(text):
+                result.append(name)
+                if limit is not None and len(result) >= limit:
+                    break
+        return result
     
     def get_template(self, name):
         """获取指定模板的完整信息"""
@@ -84,80 +496,123 @@ class TemplateManager:
     
     def set_last_used_template(self, name):
         """设置最近使用的模板"""
-        if name in self.data["templates"]:
+        with self._lock:
+            if name not in self.data["templates"] or self.data.get("last_used_template") == name:
+                return
             self.data["last_used_template"] = name
-            self.save()
+            self._journal_record("last_used", name=name)
+        self.save()
     
     def create_template(self, name, settings, is_default=False):
         """创建新模板"""
-        if name in self.data["templates"]:
-            return False, f"模板 '{name}' 已存在"
+        try:
+            TemplateParams.from_settings(settings)
+        except ValueError as e:
+            return False, str(e)
         
-        self.data["templates"][name] = {
-            "name": name,
-            "is_default": is_default,
-            "settings": settings.copy()
-        }
-        self.data["last_used_template"] = name
+        with self._lock:
+            if name in self.data["templates"]:
+                return False, f"模板 '{name}' 已存在"
+        
+            self.data["templates"][name] = {
+                "name": name,
+                "is_default": is_default,
+                "settings": settings.copy()
+            }
+            self._index_add(name)
+            if is_default:
+                # 与 set_default_template 相同，新模板取代原来的默认模板
+                previous = self._default_name
+                if previous is not None and previous in self.data["templates"]:
+                    self.data["templates"][previous]["is_default"] = False
+                self._default_name = name
+            self.data["last_used_template"] = name
+            self._journal_record("create", name=name, settings=dict(settings), is_default=is_default)
         self.save()
+        self._notify("create", name)
         return True, f"模板 '{name}' 创建成功"
     
     def update_template(self, name, settings):
         """更新现有模板"""
-        if name not in self.data["templates"]:
-            return False, f"模板 '{name}' 不存在"
+        try:
+            TemplateParams.from_settings(settings)
+        except ValueError as e:
+            return False, str(e)
         
-        self.data["templates"][name]["settings"] = settings.copy()
+        with self._lock:
+            if name not in self.data["templates"]:
+                return False, f"模板 '{name}' 不存在"
+        
+            self.data["templates"][name]["settings"] = settings.copy()
+            self._journal_record("update", name=name, settings=dict(settings))
         self.save()
+        self._notify("update", name)
         return True, f"模板 '{name}' 更新成功"
     
     def delete_template(self, name):
         """删除模板"""
-        if name not in self.data["templates"]:
-            return False, f"模板 '{name}' 不存在"
+        with self._lock:
+            if name not in self.data["templates"]:
+                return False, f"模板 '{name}' 不存在"
         
-        if self.data["templates"][name].get("is_default", False):
-            return False, "无法删除默认模板"
+            if self.data["templates"][name].get("is_default", False):
+                return False, "无法删除默认模板"
         
-        del self.data["templates"][name]
+            del self.data["templates"][name]
+            self._index_remove(name)
         
-        if self.data["last_used_template"] == name:
-            remaining = self.get_template_names()
-            if remaining:
-                self.data["last_used_template"] = remaining[0]
-            else:
-                self.data["last_used_template"] = None
+            if self.data["last_used_template"] == name:
+                remaining = self.get_template_names()
+                if remaining:
+                    self.data["last_used_template"] = remaining[0]
+                else:
+                    self.data["last_used_template"] = None
         
+            self._journal_record("delete", name=name)
         self.save()
+        self._notify("delete", name)
         return True, f"模板 '{name}' 删除成功"
     
     def rename_template(self, old_name, new_name):
         """重命名模板"""
-        if old_name not in self.data["templates"]:
-            return False, f"模板 '{old_name}' 不存在"
+        with self._lock:
+            if old_name not in self.data["templates"]:
+                return False, f"模板 '{old_name}' 不存在"
         
-        if new_name in self.data["templates"]:
-            return False, f"模板 '{new_name}' 已存在"
+            if new_name in self.data["templates"]:
+                return False, f"模板 '{new_name}' 已存在"
         
-        template = self.data["templates"].pop(old_name)
-        template["name"] = new_name
-        self.data["templates"][new_name] = template
+            template = self.data["templates"].pop(old_name)
+            template["name"] = new_name
+            self.data["templates"][new_name] = template
+            self._index_remove(old_name)
+            self._index_add(new_name)
+            if self._default_name == old_name:
+                self._default_name = new_name
         
-        if self.data["last_used_template"] == old_name:
-            self.data["last_used_template"] = new_name
+            if self.data["last_used_template"] == old_name:
+                self.data["last_used_template"] = new_name
         
+            self._journal_record("rename", old_name=old_name, new_name=new_name)
         self.save()
+        self._notify("rename", old_name)
         return True, f"模板已重命名为 '{new_name}'"
     
     def set_default_template(self, name):
         """设置默认模板"""
-        if name not in self.data["templates"]:
-            return False, f"模板 '{name}' 不存在"
+        with self._lock:
+            if name not in self.data["templates"]:
+                return False, f"模板 '{name}' 不存在"
         
-        for template_name in self.data["templates"]:
-            self.data["templates"][template_name]["is_default"] = (template_name == name)
+            previous = self._default_name
+            if previous is not None and previous in self.data["templates"]:
+                self.data["templates"][previous]["is_default"] = False
+            self.data["templates"][name]["is_default"] = True
+            self._default_name = name
         
+            self._journal_record("set_default", name=name)
         self.save()
+        self._notify("set_default", name)
         return True, f"默认模板已设置为 '{name}'"
     
     def duplicate_template(self, source_name, new_name):
@@ -170,7 +625,84 @@ class TemplateManager:
     
     def get_default_template_name(self):
         """获取默认模板名称"""
-        for name, template in self.data["templates"].items():
-            if template.get("is_default", False):
-                return name
-        return None
+        return self._default_name
+
+
+class TemplateWriter:
+    """在后台线程中保存模板数据，界面线程只负责修改内存中的数据
+    
+    接管 manager 的 on_dirty：有修改时排队，等待 delay 秒合并后续修改，再调用 manager.flush()。
+    on_saved() / on_error(message) 在后台线程中调用，需要更新界面时由调用方转回主线程。
+    """
+    
+    _STOP = object()
+    
+    def __init__(self, manager, delay=1.0, on_saved=None, on_error=None):
+        self.manager = manager
+        self.delay = delay
+        self.on_saved = on_saved
+        self.on_error = on_error
+        self._queue = queue.Queue()
+        self._stopping = threading.Event()
+        self._thread = None
+    
+    def start(self):
+        if self._thread is not None:
+            return self
+        self.manager.write_behind = True
+        self.manager.on_dirty = self.request
+        self._thread = threading.Thread(target=self._run, name="TemplateWriter", daemon=True)
+        self._thread.start()
+        if self.manager.dirty:
+            self.request()
+        return self
+    
+    def request(self):
+        """安排一次保存，可在任意线程调用"""
+        self._queue.put(True)
+    
+    def stop(self, timeout=5.0):
+        """停止后台线程，并保证所有修改都已写入文件，返回是否写入成功"""
+        if self._thread is not None:
+            self._stopping.set()
+            self._queue.put(self._STOP)
+            self._thread.join(timeout)
+            self._thread = None
+            self.manager.on_dirty = None
+        return self.manager.flush()
+    
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is not self._STOP:
+                # 等待一段时间合并后续修改，停止时立即写入
+                self._stopping.wait(self.delay)
+            while True:
+                try:
+                    if self._queue.get_nowait() is self._STOP:
+                        item = self._STOP
+                except queue.Empty:
+                    break
+            
+            self._write()
+            if item is self._STOP:
+                return
+    
+    def _write(self):
+        try:
+            saved = self.manager.flush()
+        except Exception as e:
+            saved = False
+            self.manager.last_error = e
+            print(f"保存模板数据失败: {e}")
+        
+        callback = self.on_saved if saved else self.on_error
+        if callback is None:
+            return
+        try:
+            if saved:
+                callback()
+            else:
+                callback(f"保存模板数据失败: {self.manager.last_error}")
+        except Exception as e:
+            print(f"模板保存回调失败: {e}")
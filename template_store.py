@@ -0,0 +1,338 @@
+"""基于 SQLite 的模板存储
+
+接口与 TemplateManager 相同，适合模板数量很多（每个客户一个模板）的情况：
+按名称和默认标记走索引查询，修改只更新对应的行，不再整文件重写。
+首次打开空数据库时可以从原有的 JSON 数据文件一次性迁移。
+    
+    python template_store.py 不能删除的数据文件.json templates.db
+"""
+import json
+import os
+import pathlib
+import sqlite3
+import sys
+
+import instrumentation
+from calculator_logic import TemplateParams
+from template_manager import DEFAULT_SETTINGS, BaseTemplateManager, TemplateManager
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS templates (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL UNIQUE,
+    is_default INTEGER NOT NULL DEFAULT 0,
+    settings TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_templates_default ON templates(is_default) WHERE is_default = 1;
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+class SqliteTemplateManager(BaseTemplateManager):
+    """模板存储在 SQLite 数据库中，方法与 TemplateManager 相同（不含日志合并等文件存储特有的方法）
+    
+    json_file 指定时，若数据库中还没有模板，则从该 JSON 数据文件迁移；否则写入内置默认模板。
+    迁移失败时抛出 ValueError，数据库保持为空，下次打开时重新迁移。
+    
+    read_only 为 True 时以只读方式打开已有的数据库，不建表、不迁移、不写入默认模板，修改方法会失败；
+    文件不存在或不是模板数据库时抛出 ValueError。适合命令行工具读取应用正在使用的数据库。
+    每个修改方法各自是一个事务，save() / flush() 无需再写文件。
+    """
+    
+    def __init__(self, db_file="templates.db", json_file=None, read_only=False):
+        super().__init__(db_file, read_only)
+        self.json_file = json_file
+        if read_only:
+            # mode=ro 不会创建不存在的文件，也拒绝任何写入
+            try:
+                self._conn = sqlite3.connect(
+                    pathlib.Path(db_file).absolute().as_uri() + "?mode=ro", uri=True, check_same_thread=False
+                )
+            except sqlite3.DatabaseError as e:
+                raise ValueError(f"模板数据库无法读取：{db_file}：{e}") from e
+        else:
+            self._conn = sqlite3.connect(db_file, check_same_thread=False)
+        try:
+            self.load()
+        except BaseException:
+            self._conn.close()
+            raise
+    
+    @instrumentation.timed("template.load")
+    def load(self):
+        """建表；数据库为空时迁移 JSON 数据文件或写入默认模板。只读时只检查能否读取模板表"""
+        if self.read_only:
+            try:
+                with self._lock:
+                    self._conn.execute("SELECT name, is_default, settings FROM templates LIMIT 1").fetchall()
+                    self._conn.execute("SELECT key, value FROM meta LIMIT 1").fetchall()
+            except sqlite3.DatabaseError as e:
+                raise ValueError(f"模板数据库无法读取：{self.data_file}：{e}") from e
+            return
+        
+        with self._lock, self._conn:
+            self._conn.executescript(SCHEMA)
+            empty = self._conn.execute("SELECT 1 FROM templates LIMIT 1").fetchone() is None
+        if not empty:
+            return
+        
+        if self.json_file and os.path.exists(self.json_file):
+            try:
+                # 经 TemplateManager 读取，变更日志中尚未合并的修改也一起迁移
+                self.import_data(TemplateManager(self.json_file, read_only=True).data)
+            except Exception as e:
+                # 不写入默认模板，否则数据库不再为空，以后不会重新迁移
+                raise ValueError(f"迁移模板数据失败：{e}") from e
+            return
+        self._init_default_templates()
+    
+    def import_data(self, data):
+        """在一个事务中导入 TemplateManager.data 格式的数据，已存在的同名模板会被覆盖
+        
+        导入的数据中有默认模板时，它取代数据库中原有的默认模板；有多个时只保留第一个。
+        """
+        rows = []
+        default_name = None
+        for name, template in data.get("templates", {}).items():
+            is_default = default_name is None and bool(template.get("is_default", False))
+            if is_default:
+                default_name = name
+            rows.append((name, 1 if is_default else 0,
+                         json.dumps(template.get("settings", {}), ensure_ascii=False)))
+        with self._lock, self._conn:
+            if default_name is not None:
+                self._clear_default()
+            self._conn.executemany(
+                "INSERT INTO templates (name, is_default, settings) VALUES (?, ?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET is_default = excluded.is_default, settings = excluded.settings",
+                rows
+            )
+            self._set_meta("last_used_template", data.get("last_used_template"))
+        return len(rows)
+    
+    def save(self):
+        """每次修改都已提交到数据库，无需保存"""
+    
+    def flush(self):
+        return True
+    
+    def close(self):
+        self._conn.close()
+    
+    def _init_default_templates(self):
+        """初始化默认模板"""
+        with self._lock, self._conn:
+            self._insert("默认模板", DEFAULT_SETTINGS, True)
+            self._set_meta("last_used_template", "默认模板")
+    
+    def _insert(self, name, settings, is_default=False):
+        self._conn.execute(
+            "INSERT INTO templates (name, is_default, settings) VALUES (?, ?, ?)",
+            (name, 1 if is_default else 0, json.dumps(settings, ensure_ascii=False))
+        )
+    
+    def _clear_default(self, keep=None):
+        """取消其他模板的默认标记，调用方负责事务"""
+        self._conn.execute("UPDATE templates SET is_default = 0 WHERE is_default = 1 AND name IS NOT ?", (keep,))
+    
+    def _exists(self, name):
+        return self._conn.execute("SELECT 1 FROM templates WHERE name = ?", (name,)).fetchone() is not None
+    
+    def _get_meta(self, key):
+        row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+    
+    def _set_meta(self, key, value):
+        self._conn.execute(
+            "INSERT INTO meta (key, value) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+            (key, value)
+        )
+    
+    def get_template_names(self):
+        """获取所有模板名称列表"""
+        with self._lock:
+            return [row[0] for row in self._conn.execute("SELECT name FROM templates ORDER BY id")]
+    
+    def get_sorted_template_names(self):
+        """获取按名称排序的模板名称列表"""
+        with self._lock:
+            return [row[0] for row in self._conn.execute("SELECT name FROM templates ORDER BY name")]
+    
+    def has_template(self, name):
+        """模板是否存在"""
+        with self._lock:
+            return self._exists(name)
+    
+    def find_templates(self, prefix, limit=None):
+        """按名称前缀查找模板，结果按名称排序；用名称索引做范围查询"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT name FROM templates WHERE name >= ? AND name < ? ORDER BY name LIMIT ?",
+                (prefix, prefix + "\U0010ffff", -1 if limit is None else limit)
+            )
+            return [row[0] for row in rows if row[0].startswith(prefix)]
+    
+    def search_templates(self, text, limit=None):
+        """查找名称中包含 text 的模板，前缀匹配的排在前面，其余按名称排序"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT name FROM templates WHERE instr(name, ?) > 0 "
+                "ORDER BY instr(name, ?) != 1, name LIMIT ?",
+                (text, text, -1 if limit is None else limit)
+            )
+            return [row[0] for row in rows]
+    
+    def get_template(self, name):
+        """获取指定模板的完整信息"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT name, is_default, settings FROM templates WHERE name = ?", (name,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {"name": row[0], "is_default": bool(row[1]), "settings": json.loads(row[2])}
+    
+    def get_template_settings(self, name):
+        """获取指定模板的设置"""
+        with self._lock:
+            row = self._conn.execute("SELECT settings FROM templates WHERE name = ?", (name,)).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0])
+    
+    def get_last_used_template(self):
+        """获取最近使用的模板名称"""
+        with self._lock:
+            last_used = self._get_meta("last_used_template")
+            if last_used and self._exists(last_used):
+                return last_used
+        return None
+    
+    def set_last_used_template(self, name):
+        """设置最近使用的模板"""
+        with self._lock, self._conn:
+            if self._exists(name) and self._get_meta("last_used_template") != name:
+                self._set_meta("last_used_template", name)
+    
+    def create_template(self, name, settings, is_default=False):
+        """创建新模板"""
+        try:
+            TemplateParams.from_settings(settings)
+        except ValueError as e:
+            return False, str(e)
+        
+        with self._lock, self._conn:
+            if self._exists(name):
+                return False, f"模板 '{name}' 已存在"
+            if is_default:
+                self._clear_default()
+            self._insert(name, settings, is_default)
+            self._set_meta("last_used_template", name)
+        self._notify("create", name)
+        return True, f"模板 '{name}' 创建成功"
+    
+    def update_template(self, name, settings):
+        """更新现有模板"""
+        try:
+            TemplateParams.from_settings(settings)
+        except ValueError as e:
+            return False, str(e)
+        
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "UPDATE templates SET settings = ? WHERE name = ?",
+                (json.dumps(settings, ensure_ascii=False), name)
+            )
+            if cursor.rowcount == 0:
+                return False, f"模板 '{name}' 不存在"
+        self._notify("update", name)
+        return True, f"模板 '{name}' 更新成功"
+    
+    def delete_template(self, name):
+        """删除模板"""
+        with self._lock, self._conn:
+            row = self._conn.execute("SELECT is_default FROM templates WHERE name = ?", (name,)).fetchone()
+            if row is None:
+                return False, f"模板 '{name}' 不存在"
+            if row[0]:
+                return False, "无法删除默认模板"
+            
+            self._conn.execute("DELETE FROM templates WHERE name = ?", (name,))
+            if self._get_meta("last_used_template") == name:
+                remaining = self._conn.execute("SELECT name FROM templates ORDER BY id LIMIT 1").fetchone()
+                self._set_meta("last_used_template", remaining[0] if remaining else None)
+        self._notify("delete", name)
+        return True, f"模板 '{name}' 删除成功"
+    
+    def rename_template(self, old_name, new_name):
+        """重命名模板"""
+        with self._lock, self._conn:
+            if not self._exists(old_name):
+                return False, f"模板 '{old_name}' 不存在"
+            if self._exists(new_name):
+                return False, f"模板 '{new_name}' 已存在"
+            
+            self._conn.execute("UPDATE templates SET name = ? WHERE name = ?", (new_name, old_name))
+            if self._get_meta("last_used_template") == old_name:
+                self._set_meta("last_used_template", new_name)
+        self._notify("rename", old_name)
+        return True, f"模板已重命名为 '{new_name}'"
+    
+    def set_default_template(self, name):
+        """设置默认模板"""
+        with self._lock, self._conn:
+            if not self._exists(name):
+                return False, f"模板 '{name}' 不存在"
+            self._clear_default(keep=name)
+            self._conn.execute("UPDATE templates SET is_default = 1 WHERE name = ?", (name,))
+        self._notify("set_default", name)
+        return True, f"默认模板已设置为 '{name}'"
+    
+    def duplicate_template(self, source_name, new_name):
+        """复制模板"""
+        with self._lock, self._conn:
+            if not self._exists(source_name):
+                return False, f"模板 '{source_name}' 不存在"
+            if self._exists(new_name):
+                return False, f"模板 '{new_name}' 已存在"
+            
+            self._conn.execute(
+                "INSERT INTO templates (name, is_default, settings) "
+                "SELECT ?, 0, settings FROM templates WHERE name = ?",
+                (new_name, source_name)
+            )
+            self._set_meta("last_used_template", new_name)
+        self._notify("create", new_name)
+        return True, f"模板 '{new_name}' 创建成功"
+    
+    def get_default_template_name(self):
+        """获取默认模板名称"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT name FROM templates WHERE is_default = 1 ORDER BY id LIMIT 1"
+            ).fetchone()
+        return row[0] if row else None
+
+
+def migrate(json_file, db_file):
+    """从 JSON 数据文件初始化 SQLite 数据库；数据库中已有模板时不做迁移。返回数据库中的模板数"""
+    manager = SqliteTemplateManager(db_file, json_file)
+    try:
+        return len(manager.get_template_names())
+    finally:
+        manager.close()
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 3:
+        print("用法: python template_store.py <JSON 数据文件> <SQLite 数据库>", file=sys.stderr)
+        sys.exit(2)
+    try:
+        count = migrate(sys.argv[1], sys.argv[2])
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        sys.exit(2)
+    print(f"数据库中共有 {count} 个模板")
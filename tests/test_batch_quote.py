@@ -0,0 +1,47 @@
+"""批量报价命令行工具"""
+import io
+import json
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from batch_quote import run
+from template_manager import DEFAULT_SETTINGS
+
+ORDERS = (
+    '{"opening": 30, "width": 40, "thickness": 5, "quantity": 1000}\n'
+    '{"opening": 30, "width": \n'
+    '[1, 2]\n'
+    '{"opening": 20, "width": 30, "thickness": 4, "quantity": 500}\n'
+)
+
+
+class BatchQuoteTest(unittest.TestCase):
+    def quote(self, output_format, workers=1):
+        output = io.StringIO()
+        count, errors = run(io.StringIO(ORDERS), output, dict(DEFAULT_SETTINGS), 'jsonl', output_format,
+                            workers=workers, chunk_size=2)
+        return count, errors, output.getvalue()
+    
+    def test_bad_jsonl_lines_become_row_errors(self):
+        count, errors, text = self.quote('jsonl')
+        self.assertEqual((count, errors), (4, 2))
+        records = [json.loads(line) for line in text.splitlines()]
+        self.assertEqual([record['error'] != '' for record in records], [False, True, True, False])
+        self.assertIn("第2行", records[1]['error'])
+        self.assertIn("第3行", records[2]['error'])
+        self.assertGreater(records[3]['bag_unit_price'], 0)
+    
+    def test_bad_jsonl_lines_with_workers(self):
+        self.assertEqual(self.quote('jsonl', workers=2), self.quote('jsonl'))
+    
+    def test_bad_jsonl_lines_in_csv_output(self):
+        count, errors, text = self.quote('csv')
+        self.assertEqual((count, errors), (4, 2))
+        self.assertEqual(len(text.splitlines()), 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
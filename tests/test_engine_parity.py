@@ -0,0 +1,81 @@
+"""定点引擎与 Decimal 引擎逐位一致"""
+import math
+import os
+import random
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from calculator_logic import DecimalEngine, FixedPointEngine
+
+BOUNDARY_VALUES = (
+    0.0, -0.0, 0.0005, 0.0015, 0.0025, -0.0005, -0.0015, 1.0005, 2.4995, 0.001, 0.1, 0.3,
+    1, 5, 9, 50, 100, 1000, 99.9995, 1e-7, 1e15, 1e20, 1e25, 1e28, 1e300, -1e25,
+)
+
+
+def random_value(rng):
+    kind = rng.random()
+    if kind < 0.3:
+        return rng.choice(BOUNDARY_VALUES)
+    if kind < 0.5:
+        # 正好落在千分位进位点上的半值
+        return (rng.randint(-10 ** 6, 10 ** 6) + 0.5) / 1000
+    if kind < 0.8:
+        return round(rng.uniform(-1000, 1000), rng.randint(0, 6))
+    return rng.uniform(0, 10) * 10 ** rng.randint(-10, 30)
+
+
+def outcome(method, *args):
+    try:
+        result = method(*args)
+    except Exception as e:
+        return type(e)
+    return tuple((value, math.copysign(1, value)) for value in result) if isinstance(result, tuple) \
+        else (result, math.copysign(1, result))
+
+
+class EngineParityTest(unittest.TestCase):
+    STAGES = (('material', 6), ('process', 3), ('printing', 3), ('bag_unit_price', 3), ('round_price', 1))
+    
+    def setUp(self):
+        self.fixed = FixedPointEngine()
+        self.decimal = DecimalEngine()
+    
+    def check(self, name, args):
+        self.assertEqual(outcome(getattr(self.fixed, name), *args), outcome(getattr(self.decimal, name), *args),
+                         f"{name}{args}")
+    
+    def test_boundary_values(self):
+        for name, arity in self.STAGES:
+            for value in BOUNDARY_VALUES:
+                for position in range(arity):
+                    args = [1.5] * arity
+                    args[position] = value
+                    self.check(name, tuple(args))
+    
+    def test_zero_quantity(self):
+        for value in BOUNDARY_VALUES:
+            self.check('material', (30, 40, 5, 0.95, value, 0))
+            self.check('process', (value, 0, 0.2))
+            self.check('printing', (0, 0.015, value))
+            self.check('printing', (-0.0, value, 100))
+    
+    def test_huge_values(self):
+        self.check('round_price', (1e25,))
+        self.check('round_price', (-1e25,))
+        self.check('printing', (1000, 0.015, 1e300))
+        self.check('printing', (0, 0.015, 1e300))
+        self.check('process', (1e300, 1000, 0.2))
+        self.check('material', (1e10, 1e10, 1e5, 1, 1, 1))
+    
+    def test_random_inputs(self):
+        rng = random.Random(20260301)
+        for _ in range(20000):
+            name, arity = rng.choice(self.STAGES)
+            self.check(name, tuple(random_value(rng) for _ in range(arity)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+"""报价历史的崩溃恢复"""
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from calculator_logic import TemplateParams, quote
+from quote_history import QuoteHistory
+
+
+class QuoteHistoryTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.history_file = os.path.join(self.directory.name, "history.bin")
+        self.params = TemplateParams.from_settings({})
+    
+    def tearDown(self):
+        self.directory.cleanup()
+    
+    def add(self, history, quantity, template_name="甲"):
+        return history.add(quote(self.params.quote_input(30, 40, 5, quantity)), template_name, timestamp=quantity)
+    
+    def test_torn_name_line_is_dropped(self):
+        history = QuoteHistory(self.history_file)
+        self.add(history, 1000)
+        history.flush()
+        with open(history.names_file, 'a', encoding='utf-8') as f:
+            f.write('"乙')
+        
+        history = QuoteHistory(self.history_file)
+        self.assertEqual([entry.template_name for entry in history.recent()], ["甲"])
+        self.add(history, 2000, "乙")
+        history.flush()
+        
+        history = QuoteHistory(self.history_file)
+        self.assertEqual([entry.template_name for entry in history.recent()], ["乙", "甲"])
+    
+    def test_failed_flush_leaves_no_partial_records(self):
+        history = QuoteHistory(self.history_file)
+        self.add(history, 1000)
+        history.flush()
+        
+        self.add(history, 2000)
+        with mock.patch('quote_history.os.fsync', side_effect=OSError(28, "No space left on device")):
+            self.assertFalse(history.flush())
+        self.add(history, 3000)
+        self.assertTrue(history.flush())
+        
+        history = QuoteHistory(self.history_file)
+        self.assertEqual([entry.quantity for entry in history.iter_entries()], [1000, 2000, 3000])
+
+    
+    def test_read_only_open_leaves_files_untouched(self):
+        history = QuoteHistory(self.history_file)
+        self.add(history, 1000)
+        history.flush()
+        with open(history.names_file, 'a', encoding='utf-8') as f:
+            f.write('"乙')
+        with open(self.history_file, 'ab') as f:
+            f.write(b"\0" * 5)
+        sizes = (os.path.getsize(self.history_file), os.path.getsize(history.names_file))
+        
+        history = QuoteHistory(self.history_file, read_only=True)
+        self.assertEqual([entry.template_name for entry in history.iter_entries()], ["甲"])
+        self.assertEqual((os.path.getsize(self.history_file), os.path.getsize(history.names_file)), sizes)
+    
+    def test_unreadable_name_table_is_an_error(self):
+        history = QuoteHistory(self.history_file)
+        self.add(history, 1000)
+        history.flush()
+        os.remove(history.names_file)
+        os.mkdir(history.names_file)
+        
+        with self.assertRaises(ValueError):
+            QuoteHistory(self.history_file, read_only=True)
+    
+    def test_pending_records_are_bounded_when_writes_fail(self):
+        history = QuoteHistory(self.history_file, flush_every=4, max_pending=8)
+        with mock.patch('quote_history.os.fsync', side_effect=OSError(28, "No space left on device")):
+            for quantity in range(1, 21):
+                self.add(history, quantity)
+        self.assertEqual(len(history._pending), 8)
+        self.assertEqual(history.dropped, 12)
+        self.assertTrue(history.flush())
+        self.assertEqual([entry.quantity for entry in history.iter_entries()], list(range(13, 21)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,52 @@
+"""calculate_all 结果字典中延迟生成的 detail_text"""
+import copy
+import json
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from calculator_logic import CalculatorLogic, TemplateParams
+
+
+class QuoteResultTest(unittest.TestCase):
+    def setUp(self):
+        self.logic = CalculatorLogic()
+        self.logic.apply_params(TemplateParams.from_settings({}))
+        self.logic.set_params_values(30, 40, 5, 1000)
+    
+    def result(self):
+        return self.logic.calculate_all()
+    
+    def test_membership_does_not_build_text(self):
+        result = self.result()
+        self.assertIn('detail_text', result)
+        self.assertEqual(len(result), len(dict(result)))
+        self.assertIsNone(self.result().quote._detail_text)
+    
+    def test_behaves_like_plain_dict(self):
+        expected = dict(self.result())
+        self.assertIn('detail_text', expected)
+        self.assertEqual(list(self.result()), list(expected))
+        self.assertEqual(dict(self.result().items()), expected)
+        self.assertEqual(self.result().copy(), expected)
+        self.assertEqual(copy.copy(self.result()), expected)
+        self.assertEqual({**self.result()}, expected)
+        self.assertEqual(json.loads(json.dumps(self.result())), expected)
+        self.assertEqual(self.result(), expected)
+    
+    def test_removed_or_replaced_text_stays_that_way(self):
+        result = self.result()
+        result.pop('detail_text')
+        self.assertNotIn('detail_text', result)
+        self.assertIsNone(result.get('detail_text'))
+        self.assertEqual(len(result), len(dict(result)))
+        
+        result = self.result()
+        result['detail_text'] = "x"
+        self.assertEqual(dict(result)['detail_text'], "x")
+
+
+if __name__ == '__main__':
+    unittest.main()
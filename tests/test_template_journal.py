@@ -0,0 +1,117 @@
+"""模板变更日志的崩溃恢复"""
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from template_manager import DEFAULT_SETTINGS, TemplateManager
+from template_store import SqliteTemplateManager
+
+
+class TemplateJournalTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.data_file = os.path.join(self.directory.name, "templates.json")
+    
+    def tearDown(self):
+        self.directory.cleanup()
+    
+    def open(self, **kwargs):
+        return TemplateManager(self.data_file, journal=True, **kwargs)
+    
+    def test_torn_record_does_not_swallow_next_change(self):
+        manager = self.open()
+        manager.create_template("A", dict(DEFAULT_SETTINGS))
+        manager.create_template("B", dict(DEFAULT_SETTINGS))
+        # 模拟写到一半时崩溃
+        with open(manager.journal_file, 'a', encoding='utf-8') as f:
+            f.write('{"name": "C", "settings": {"param')
+        
+        manager = self.open()
+        self.assertEqual(manager.get_template_names(), ["默认模板", "A", "B"])
+        manager.create_template("D", dict(DEFAULT_SETTINGS))
+        manager.create_template("E", dict(DEFAULT_SETTINGS))
+        
+        self.assertEqual(self.open().get_template_names(), ["默认模板", "A", "B", "D", "E"])
+    
+    def test_plain_load_does_not_rewrite_journaled_data(self):
+        manager = self.open()
+        manager.create_template("A", dict(DEFAULT_SETTINGS))
+        with open(self.data_file, 'rb') as f:
+            snapshot = f.read()
+        
+        # 命令行工具不使用日志打开同一个数据文件
+        self.assertIn("A", TemplateManager(self.data_file).get_template_names())
+        with open(self.data_file, 'rb') as f:
+            self.assertEqual(f.read(), snapshot)
+        
+        manager.create_template("B", dict(DEFAULT_SETTINGS))
+        self.assertEqual(self.open().get_template_names(), ["默认模板", "A", "B"])
+    
+    def test_plain_save_folds_journal_into_snapshot(self):
+        self.open().create_template("A", dict(DEFAULT_SETTINGS))
+        
+        manager = TemplateManager(self.data_file)
+        manager.create_template("B", dict(DEFAULT_SETTINGS))
+        
+        self.assertEqual(self.open().get_template_names(), ["默认模板", "A", "B"])
+    
+    def test_read_only_load_reports_damaged_file(self):
+        with open(self.data_file, 'w', encoding='utf-8') as f:
+            f.write('{"templates": {"A"')
+        
+        with self.assertRaises(ValueError):
+            TemplateManager(self.data_file, read_only=True)
+        with open(self.data_file, encoding='utf-8') as f:
+            self.assertEqual(f.read(), '{"templates": {"A"')
+    
+    def test_new_default_template_survives_replay(self):
+        manager = self.open()
+        manager.create_template("X", dict(DEFAULT_SETTINGS), is_default=True)
+        self.assertEqual(manager.get_default_template_name(), "X")
+        
+        manager = self.open()
+        self.assertEqual(manager.get_default_template_name(), "X")
+        self.assertFalse(manager.get_template("默认模板")["is_default"])
+        self.assertTrue(manager.delete_template("默认模板")[0])
+    
+    def test_invalid_records_are_skipped(self):
+        manager = self.open()
+        for name in ("A", "B"):
+            manager.create_template(name, dict(DEFAULT_SETTINGS))
+        with open(manager.journal_file, 'a', encoding='utf-8') as f:
+            f.write('{"op": "update", "nme": "A"}\n[1]\n5\n')
+            f.write('{"op": "create", "name": "X", "settings": [1]}\n')
+        manager.create_template("C", dict(DEFAULT_SETTINGS))
+        
+        manager = self.open()
+        self.assertIsNone(manager.load_error)
+        self.assertEqual(manager.get_template_names(), ["默认模板", "A", "B", "C"])
+    
+    def test_damaged_snapshot_is_not_replaced_by_defaults(self):
+        self.open().create_template("A", dict(DEFAULT_SETTINGS))
+        with open(self.data_file, 'w', encoding='utf-8') as f:
+            f.write('{"templates": {"A"')
+        
+        manager = self.open()
+        self.assertIsNotNone(manager.load_error)
+        self.assertEqual(manager.get_template_names(), ["默认模板"])
+        manager.create_template("B", dict(DEFAULT_SETTINGS))
+        manager.flush()
+        with open(self.data_file, encoding='utf-8') as f:
+            self.assertEqual(f.read(), '{"templates": {"A"')
+    
+    def test_sqlite_migration_includes_journaled_changes(self):
+        self.open().create_template("A", dict(DEFAULT_SETTINGS))
+        
+        store = SqliteTemplateManager(os.path.join(self.directory.name, "templates.db"), self.data_file)
+        try:
+            self.assertEqual(store.get_template_names(), ["默认模板", "A"])
+        finally:
+            store.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+"""SQLite 模板存储"""
+import os
+import sqlite3
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from template_manager import DEFAULT_SETTINGS
+from template_store import SqliteTemplateManager
+
+
+class SqliteTemplateManagerTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.db_file = os.path.join(self.directory.name, "templates.db")
+    
+    def tearDown(self):
+        self.directory.cleanup()
+    
+    def open(self, *args, **kwargs):
+        store = SqliteTemplateManager(self.db_file, *args, **kwargs)
+        self.addCleanup(store.close)
+        return store
+    
+    def default_names(self, store):
+        return [row[0] for row in store._conn.execute("SELECT name FROM templates WHERE is_default = 1")]
+    
+    def test_new_default_template_replaces_old_default(self):
+        store = self.open()
+        store.create_template("X", dict(DEFAULT_SETTINGS), is_default=True)
+        self.assertEqual(self.default_names(store), ["X"])
+        self.assertTrue(store.delete_template("默认模板")[0])
+    
+    def test_imported_default_replaces_old_default(self):
+        store = self.open()
+        store.import_data({"templates": {
+            "A": {"is_default": True, "settings": dict(DEFAULT_SETTINGS)},
+            "B": {"is_default": True, "settings": dict(DEFAULT_SETTINGS)},
+        }})
+        self.assertEqual(self.default_names(store), ["A"])
+    
+    def test_failed_migration_leaves_database_empty(self):
+        json_file = os.path.join(self.directory.name, "templates.json")
+        with open(json_file, 'w', encoding='utf-8') as f:
+            f.write('{"templates": {"A"')
+        
+        with self.assertRaises(ValueError):
+            self.open(json_file)
+        
+        with open(json_file, 'w', encoding='utf-8') as f:
+            f.write('{"templates": {"A": {"is_default": true, "settings": {}}}}')
+        self.assertEqual(self.open(json_file).get_template_names(), ["A"])
+
+    
+    def test_read_only_open_never_writes(self):
+        sqlite3.connect(self.db_file).close()
+        with self.assertRaises(ValueError):
+            self.open(read_only=True)
+        self.assertEqual(os.path.getsize(self.db_file), 0)
+        
+        with open(self.db_file, 'w', encoding='utf-8') as f:
+            f.write("not a database")
+        with self.assertRaises(ValueError):
+            self.open(read_only=True)
+    
+    def test_read_only_open_reads_templates(self):
+        self.open().create_template("X", dict(DEFAULT_SETTINGS))
+        with open(self.db_file, 'rb') as f:
+            content = f.read()
+        
+        store = self.open(read_only=True)
+        self.assertEqual(store.get_template_names(), ["默认模板", "X"])
+        self.assertEqual(store.get_default_template_name(), "默认模板")
+        store.close()
+        with open(self.db_file, 'rb') as f:
+            self.assertEqual(f.read(), content)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,44 @@
+"""数据文件的原子替换"""
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import template_manager
+from template_manager import _write_atomic
+
+
+class WriteAtomicTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "data.json")
+    
+    def tearDown(self):
+        self.directory.cleanup()
+    
+    def test_replaces_file_and_syncs_directory(self):
+        _write_atomic(self.path, "old")
+        os.chmod(self.path, 0o640)
+        with mock.patch.object(template_manager, '_fsync_directory') as fsync_directory:
+            _write_atomic(self.path, "new")
+        fsync_directory.assert_called_once_with(self.directory.name)
+        with open(self.path, encoding='utf-8') as f:
+            self.assertEqual(f.read(), "new")
+        self.assertEqual(os.stat(self.path).st_mode & 0o777, 0o640)
+        self.assertEqual(os.listdir(self.directory.name), ["data.json"])
+    
+    def test_failed_replace_keeps_target_and_removes_temp_file(self):
+        _write_atomic(self.path, "old")
+        with mock.patch.object(template_manager.os, 'replace', side_effect=OSError("disk full")):
+            with self.assertRaises(OSError):
+                _write_atomic(self.path, "new")
+        with open(self.path, encoding='utf-8') as f:
+            self.assertEqual(f.read(), "old")
+        self.assertEqual(os.listdir(self.directory.name), ["data.json"])
+
+
+if __name__ == '__main__':
+    unittest.main()